@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+import os
+from typing import AsyncIterator, Deque
+
+from .metrics import admission_rejected
+
+
+EMBED_LIMIT = int(os.getenv("RAG_EMBED_LIMIT", "4"))
+EMBED_QUEUE = int(os.getenv("RAG_EMBED_QUEUE", "64"))
+RERANK_LIMIT = int(os.getenv("RAG_RERANK_LIMIT", "2"))
+RERANK_QUEUE = int(os.getenv("RAG_RERANK_QUEUE", "16"))
+GENERATE_LIMIT = int(os.getenv("RAG_GENERATE_LIMIT", "2"))
+GENERATE_QUEUE = int(os.getenv("RAG_GENERATE_QUEUE", "16"))
+QUEUE_TIMEOUT = float(os.getenv("RAG_QUEUE_TIMEOUT", "30"))
+RETRY_AFTER = int(os.getenv("RAG_RETRY_AFTER", "5"))
+
+
+class Overloaded(Exception):
+    """File d'attente pleine (ou attente trop longue) : l'API repond 503 + Retry-After."""
+
+    def __init__(self, stage: str, retry_after: int = RETRY_AFTER) -> None:
+        super().__init__(f"Too many pending {stage} calls")
+        self.stage = stage
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    Au plus `limit` appels en cours, `max_queue` en attente (FIFO) ; au-dela, Overloaded
+    tout de suite plutot que d'empiler des requetes qui finiront en timeout.
+    """
+
+    def __init__(
+        self,
+        stage: str,
+        limit: int,
+        max_queue: int,
+        timeout: float = QUEUE_TIMEOUT,
+        retry_after: int = RETRY_AFTER,
+    ) -> None:
+        self.stage = stage
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def _bind(self) -> asyncio.AbstractEventLoop:
+        # les futures sont liees a une event loop (un asyncio.run par test ou benchmark)
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self.active = 0
+            self._waiters.clear()
+        return loop
+
+    def reject(self) -> Overloaded:
+        admission_rejected.inc(stage=self.stage)
+        return Overloaded(self.stage, self.retry_after)
+
+    async def acquire(self) -> None:
+        loop = self._bind()
+        if self.limit <= 0:
+            return
+        if self.active < self.limit and not self.waiting:
+            self.active += 1
+            return
+        if self.waiting >= self.max_queue:
+            raise self.reject()
+        waiter = loop.create_future()
+        self._waiters.append(waiter)
+        try:
+            # release() transmet sa place : `active` reste compte pour nous
+            await asyncio.wait_for(waiter, self.timeout if self.timeout > 0 else None)
+        except asyncio.TimeoutError:
+            # place transmise juste avant l'expiration : on la rend avant de refuser
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise self.reject() from None
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        if self.limit <= 0:
+            return
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+
+# limites par processus : chaque worker uvicorn a les siennes
+embed_limiter = AdmissionLimiter("embed", EMBED_LIMIT, EMBED_QUEUE)
+rerank_limiter = AdmissionLimiter("rerank", RERANK_LIMIT, RERANK_QUEUE)
+generate_limiter = AdmissionLimiter("generate", GENERATE_LIMIT, GENERATE_QUEUE)
+LIMITERS = (embed_limiter, rerank_limiter, generate_limiter)
@@ -1,22 +1,45 @@
 # agent.py
+import asyncio
+from dataclasses import dataclass
 import os
 import re
 from urllib.parse import urlparse
 from urllib.parse import urlparse
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import AsyncIterator, Dict, List, Set, Tuple
 
 import httpx
 
-from .rag import load_index, search_index, shorten, rerank_results
+from . import ollama_client
+from .admission import LIMITERS, generate_limiter
+from .cache import LRUCache
+from .lexical import BM25Index, tokenize
+from . import metrics
+from .metrics import mark_coalesced, request_timings, timed
+from .rag import (
+    VectorIndex,
+    normalize_query,
+    query_embedding_cache,
+    rerank_score_cache,
+    search_index_async,
+    shorten,
+)
+from .reloader import IndexReloader
+from .rerank import get_reranker, rerank_within_budget
+from .sessions import SessionStore, create_session_store
+from .singleflight import SingleFlight
 
 
 # session_id -> liste de (role, content)
 OLLAMA_CHAT_MODEL = os.getenv("OLLAMA_CHAT_MODEL", "llama3.2")
-OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
-INDEX_PATH = Path(os.getenv("RAG_INDEX_PATH", "rag_index.jsonl"))
+INDEX_PATH = Path(os.getenv("RAG_INDEX_PATH", "rag_index"))
 DIFFICULTY_THRESHOLD = int(os.getenv("DIFFICULTY_THRESHOLD", "2"))
-RERANK_ENABLED = os.getenv("RAG_RERANK", "1") != "0"
+ANSWER_CACHE_SIZE = int(os.getenv("RAG_ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL = float(os.getenv("RAG_ANSWER_CACHE_TTL", "900"))
+LEGACY_INDEX_PATH = Path("rag_index.jsonl")
+if "RAG_INDEX_PATH" not in os.environ and not INDEX_PATH.exists() and LEGACY_INDEX_PATH.is_file():
+    # deploiement d'avant le format binaire : l'ancien fichier reste servi jusqu'au prochain build
+    INDEX_PATH = LEGACY_INDEX_PATH
 
 SMALLTALK_PATTERNS = [
     "bonjour",
@@ -55,22 +78,44 @@ EPITECH_KEYWORDS = [
     "masters",
 ]
 PGE_BASE_URL = "https://www.epitech.eu/programme-grande-ecole-informatique"
-_INDEX_CACHE: List[Dict[str, object]] | None = None
-_INDEX_MTIME = 0.0
-
-# session_id -> liste de (role, content)
-conversations: Dict[str, List[Tuple[str, str]]] = {}
-
-
-def get_index() -> List[Dict[str, object]]:
-    global _INDEX_CACHE, _INDEX_MTIME
-    if not INDEX_PATH.exists():
-        return []
-    mtime = INDEX_PATH.stat().st_mtime
-    if _INDEX_CACHE is None or mtime != _INDEX_MTIME:
-        _INDEX_CACHE = load_index(INDEX_PATH)
-        _INDEX_MTIME = mtime
-    return _INDEX_CACHE or []
+PROGRAM_TYPES = ("mba", "msc", "bachelor", "pge")
+
+# session_id -> liste de (role, content), LRU/TTL ; RAG_SESSION_BACKEND=sqlite pour plusieurs workers
+sessions: SessionStore = create_session_store()
+
+# (question normalisee, chunks sources, version de l'index, modele) -> reponse generee
+answer_cache = LRUCache(maxsize=ANSWER_CACHE_SIZE, ttl=ANSWER_CACHE_TTL)
+
+# questions identiques en cours (sans historique) : un seul retrieval + generation par rafale
+answer_flights = SingleFlight("answer")
+stream_flights = SingleFlight("stream")
+
+# strategie choisie par RAG_RERANK (llm, local, off)
+reranker = get_reranker()
+
+# index + facettes d'URL, recharges en fond quand une nouvelle generation est publiee
+index_reloader = IndexReloader(INDEX_PATH, lambda index: build_url_facets(index))
+
+
+def collect_metrics() -> None:
+    """Met a jour les jauges lues au moment du scrape /metrics."""
+    snapshot = index_reloader.snapshot
+    if snapshot is not None:
+        metrics.index_chunks.set(len(snapshot.index))
+        metrics.index_generation.set(snapshot.generation)
+    caches = {"query_embedding": query_embedding_cache, "rerank_score": rerank_score_cache, "answer": answer_cache}
+    for name, cache in caches.items():
+        stats = cache.stats()
+        metrics.cache_hits.set(stats["hits"], cache=name)
+        metrics.cache_misses.set(stats["misses"], cache=name)
+        metrics.cache_hit_ratio.set(stats["hit_rate"], cache=name)
+        metrics.cache_entries.set(stats["size"], cache=name)
+    metrics.sessions_active.set(len(sessions))
+    for limiter in LIMITERS:
+        metrics.admission_active.set(limiter.active, stage=limiter.stage)
+        metrics.admission_waiting.set(limiter.waiting, stage=limiter.stage)
+    for flights in (answer_flights, stream_flights):
+        metrics.singleflight_inflight.set(len(flights), flight=flights.name)
 
 
 def build_sources(hits: List[Dict[str, object]]) -> Tuple[str, List[Dict[str, str]]]:
@@ -182,57 +227,100 @@ def is_campus_url(url: str) -> bool:
 
 
 def is_program_url(url: str, question: str) -> bool:
+    return bool(program_types_for_url(url) & program_types_for_question(question))
+
+
+def program_types_for_url(url: str) -> Set[str]:
     path = urlparse(url).path.lower()
+    types: Set[str] = set()
+    if contains_any(path, ["mba", "master-of-business"]):
+        types.add("mba")
+    if contains_any(path, ["msc", "master-of-science", "msc-pro"]):
+        types.add("msc")
+    if "bachelor" in path:
+        types.add("bachelor")
+    if contains_any(path, ["programme-grande-ecole", "diplome-expert-informatique"]):
+        types.add("pge")
+    return types
+
+
+def program_types_for_question(question: str) -> Set[str]:
     q = question.lower()
+    types: Set[str] = set()
     if "mba" in q:
-        if contains_any(path, ["mba", "master-of-business"]):
-            return True
+        types.add("mba")
     if "msc" in q:
-        if contains_any(path, ["msc", "master-of-science", "msc-pro"]):
-            return True
+        types.add("msc")
     if "bachelor" in q:
-        if "bachelor" in path:
-            return True
+        types.add("bachelor")
     if "pge" in q or "programme grande ecole" in q or "programme grande école" in q:
-        if contains_any(path, ["programme-grande-ecole", "diplome-expert-informatique"]):
-            return True
-    return False
+        types.add("pge")
+    return types
 
 
 def is_pge_url(url: str) -> bool:
     return url.rstrip("/") == PGE_BASE_URL
 
 
-def select_campus_candidates(index: List[Dict[str, object]]) -> List[Dict[str, object]]:
-    candidates = [entry for entry in index if is_campus_url(str(entry.get("url", "")))]
-    if candidates:
-        candidates.sort(key=lambda entry: str(entry.get("url", "")))
-        return candidates
-    fallback = [entry for entry in index if not is_post_url(str(entry.get("url", "")))]
-    fallback.sort(key=lambda entry: str(entry.get("url", "")))
-    return fallback
-
-
-def select_program_candidates(index: List[Dict[str, object]], question: str) -> List[Dict[str, object]]:
-    candidates = [
-        entry for entry in index if is_program_url(str(entry.get("url", "")), question)
-    ]
-    if candidates:
-        candidates.sort(key=lambda entry: str(entry.get("url", "")))
-        return candidates
-    fallback = [entry for entry in index if not is_post_url(str(entry.get("url", "")))]
-    fallback.sort(key=lambda entry: str(entry.get("url", "")))
-    return fallback
-
-
-def select_pge_candidates(index: List[Dict[str, object]]) -> List[Dict[str, object]]:
-    candidates = [entry for entry in index if is_pge_url(str(entry.get("url", "")))]
-    if candidates:
-        candidates.sort(key=lambda entry: str(entry.get("url", "")))
-        return candidates
-    fallback = [entry for entry in index if not is_post_url(str(entry.get("url", "")))]
-    fallback.sort(key=lambda entry: str(entry.get("url", "")))
-    return fallback
+@dataclass
+class UrlFacets:
+    """Facettes d'URL calculees une fois par version d'index : ids de lignes tries par URL."""
+
+    index: VectorIndex
+    rank: List[int]  # position de chaque ligne dans l'ordre des URLs
+    pages: List[int]  # hors articles dates
+    campus: List[int]
+    pge: List[int]
+    programs: Dict[str, List[int]]
+    msc: List[Dict[str, str]]
+    mba: List[Dict[str, str]]
+
+
+def build_url_facets(index: VectorIndex) -> UrlFacets:
+    urls = index.urls()
+    order = sorted(range(len(urls)), key=urls.__getitem__)
+    rank = [0] * len(urls)
+    pages: List[int] = []
+    campus: List[int] = []
+    pge: List[int] = []
+    programs: Dict[str, List[int]] = {kind: [] for kind in PROGRAM_TYPES}
+    # une URL couvre plusieurs chunks : chaque URL n'est analysee qu'une fois
+    kinds: Dict[str, Tuple[bool, bool, bool, Set[str]]] = {}
+    for position, row in enumerate(order):
+        rank[row] = position
+        url = urls[row]
+        info = kinds.get(url)
+        if info is None:
+            info = (is_post_url(url), is_campus_url(url), is_pge_url(url), program_types_for_url(url))
+            kinds[url] = info
+        is_post, is_campus, is_pge, types = info
+        if not is_post:
+            pages.append(row)
+        if is_campus:
+            campus.append(row)
+        if is_pge:
+            pge.append(row)
+        for kind in types:
+            programs[kind].append(row)
+    msc, mba = collect_master_specialties(index)
+    return UrlFacets(index, rank, pages, campus, pge, programs, msc, mba)
+
+
+def select_campus_candidates(facets: UrlFacets) -> List[int]:
+    return facets.campus or facets.pages
+
+
+def select_program_candidates(facets: UrlFacets, question: str) -> List[int]:
+    groups = [facets.programs[kind] for kind in program_types_for_question(question) if facets.programs[kind]]
+    if not groups:
+        return facets.pages
+    if len(groups) == 1:
+        return groups[0]
+    return sorted(set().union(*groups), key=facets.rank.__getitem__)
+
+
+def select_pge_candidates(facets: UrlFacets) -> List[int]:
+    return facets.pge or facets.pages
 
 
 def is_msc_url(url: str) -> bool:
@@ -337,16 +425,41 @@ def required_term_groups(message: str) -> List[List[str]]:
     return groups
 
 
-def sources_cover_terms(hits: List[Dict[str, object]], term_groups: List[List[str]]) -> bool:
+def sources_cover_terms(
+    hits: List[Dict[str, object]],
+    term_groups: List[List[str]],
+    lexical: BM25Index | None = None,
+) -> bool:
     if not term_groups:
         return True
-    combined = " ".join(str(hit.get("text", "")).lower() for hit in hits)
+    rows = {int(hit["id"]): hit for hit in hits if "id" in hit}
+    combined = None
     for group in term_groups:
+        # postings BM25 = chemin rapide si le mot exact est present ; sinon recherche de sous-chaine
+        # sur les textes ("bachelor" doit aussi trouver "Bachelors")
+        if lexical is not None and any(hits_contain_term(lexical, rows, term) for term in group):
+            continue
+        if combined is None:
+            combined = " ".join(str(hit.get("text", "")).lower() for hit in hits)
         if not any(term in combined for term in group):
             return False
     return True
 
 
+def hits_contain_term(lexical: BM25Index, hits: Dict[int, Dict[str, object]], term: str) -> bool:
+    tokens = tokenize(term)
+    frequency = min((lexical.document_frequency(token) for token in tokens), default=0)
+    if not frequency or frequency > len(hits):
+        # absent du vocabulaire, ou postings plus longues que les hits : la relecture des
+        # quelques textes par sources_cover_terms coute moins cher
+        return False
+    rows = lexical.rows_with_phrase(term, list(hits))
+    if len(tokens) == 1:
+        return bool(rows.size)
+    # les postings ignorent l'ordre des mots : on confirme l'expression sur les seuls chunks retenus
+    return any(term in str(hits[int(row)].get("text", "")).lower() for row in rows)
+
+
 def extract_snippet(text: str, start: int, end: int, window: int = 200) -> str:
     left = max(0, start - 80)
     right = min(len(text), end + window)
@@ -406,37 +519,48 @@ def extract_pge_answer(hits: List[Dict[str, object]]) -> str | None:
     )
 
 
-async def run_agent(user_message: str, session_id: str) -> Tuple[str, List[Dict[str, str]]]:
+@dataclass
+class AgentTurn:
+    answer: str
+    sources: List[Dict[str, str]]
+    prompt: str | None = None  # prompt a envoyer au LLM si la reponse reste a generer
+    history: List[Tuple[str, str]] | None = None
+    cache_key: Tuple[object, ...] | None = None
+
+
+async def prepare_turn(user_message: str, session_id: str) -> AgentTurn:
     """
     Gère une conversation par session_id et répond uniquement sur la base
     des informations EPITECH (locales + scraping HTTP).
     """
     # Historique
-    history = conversations.get(session_id, [])
+    history = await sessions.get_async(session_id)
     history.append(("user", user_message))
     history = history[-6:]
-    conversations[session_id] = history
-
-    smalltalk = detect_smalltalk(user_message)
-    if smalltalk:
-        history.append(("assistant", smalltalk))
-        conversations[session_id] = history
-        return smalltalk, []
-
-    score = difficulty_score(user_message)
-    if score < DIFFICULTY_THRESHOLD:
-        answer = (
-            "Je peux aider sur EPITECH (campus, admissions, programmes, alternance). "
-            "Peux-tu preciser ta question ?"
-        )
-        history.append(("assistant", answer))
-        conversations[session_id] = history
-        return answer, []
+    await sessions.set_async(session_id, history)
+
+    # garde-fous : smalltalk, difficulte, type de question
+    with timed("guardrails"):
+        smalltalk = detect_smalltalk(user_message)
+        if smalltalk:
+            history.append(("assistant", smalltalk))
+            await sessions.set_async(session_id, history)
+            return AgentTurn(smalltalk, [])
+
+        score = difficulty_score(user_message)
+        if score < DIFFICULTY_THRESHOLD:
+            answer = (
+                "Je peux aider sur EPITECH (campus, admissions, programmes, alternance). "
+                "Peux-tu preciser ta question ?"
+            )
+            history.append(("assistant", answer))
+            await sessions.set_async(session_id, history)
+            return AgentTurn(answer, [])
 
-    campus_question = is_campus_question(user_message)
-    pge_question = is_pge_question(user_message)
-    master_specialty_question = is_master_specialty_question(user_message)
-    program_question = is_program_question(user_message)
+        campus_question = is_campus_question(user_message)
+        pge_question = is_pge_question(user_message)
+        master_specialty_question = is_master_specialty_question(user_message)
+        program_question = is_program_question(user_message)
 
     # Rôle système : réponses sourcées et structurées
     system_context = (
@@ -468,65 +592,50 @@ async def run_agent(user_message: str, session_id: str) -> Tuple[str, List[Dict[
             prefix = "Utilisateur" if role == "user" else "Assistant"
             history_text += f"{prefix} : {content}\n"
 
-    index = get_index()
+    snapshot = index_reloader.snapshot
+    if snapshot is None:
+        snapshot = await asyncio.to_thread(index_reloader.current)
+    index = snapshot.index
     if not index:
-        return (
+        return AgentTurn(
             "Aucune base de connaissances n'est disponible. Lance l'indexation du site EPITECH "
             "pour que je puisse répondre avec des sources.",
             [],
         )
 
+    facets: UrlFacets = snapshot.derived
     if master_specialty_question:
-        msc_entries, mba_entries = collect_master_specialties(index)
-        answer, sources = build_master_specialties_answer(msc_entries, mba_entries)
+        answer, sources = build_master_specialties_answer(facets.msc, facets.mba)
         if answer:
             history.append(("assistant", answer))
-            conversations[session_id] = history
-            return answer, sources
+            await sessions.set_async(session_id, history)
+            return AgentTurn(answer, sources)
     if campus_question:
-        candidate_pool = select_campus_candidates(index)
-        if len(candidate_pool) > 200:
-            candidate_pool = candidate_pool[:200]
-        candidates = search_index(candidate_pool, user_message, top_k=12)
-        hits = (
-            rerank_results(user_message, candidates, top_k=8)
-            if RERANK_ENABLED
-            else candidates[:8]
-        )
+        candidate_pool = select_campus_candidates(facets)[:200]
+        candidates = await search_index_async(index, user_message, top_k=12, rows=candidate_pool)
+        hits = await rerank_within_budget(reranker, user_message, candidates, top_k=8)
     elif pge_question:
-        candidate_pool = select_pge_candidates(index)
-        if len(candidate_pool) > 80:
-            candidate_pool = candidate_pool[:80]
-        candidates = search_index(candidate_pool, user_message, top_k=8)
-        hits = (
-            rerank_results(user_message, candidates, top_k=6)
-            if RERANK_ENABLED
-            else candidates[:6]
-        )
+        candidate_pool = select_pge_candidates(facets)[:80]
+        candidates = await search_index_async(index, user_message, top_k=8, rows=candidate_pool)
+        hits = await rerank_within_budget(reranker, user_message, candidates, top_k=6)
     elif program_question:
-        candidate_pool = select_program_candidates(index, user_message)
-        if len(candidate_pool) > 200:
-            candidate_pool = candidate_pool[:200]
-        candidates = search_index(candidate_pool, user_message, top_k=12)
-        hits = (
-            rerank_results(user_message, candidates, top_k=6)
-            if RERANK_ENABLED
-            else candidates[:6]
-        )
+        candidate_pool = select_program_candidates(facets, user_message)[:200]
+        candidates = await search_index_async(index, user_message, top_k=12, rows=candidate_pool)
+        hits = await rerank_within_budget(reranker, user_message, candidates, top_k=6)
     else:
-        candidates = search_index(index, user_message, top_k=8)
-        hits = rerank_results(user_message, candidates, top_k=4) if RERANK_ENABLED else candidates[:4]
+        candidates = await search_index_async(index, user_message, top_k=8)
+        hits = await rerank_within_budget(reranker, user_message, candidates, top_k=4)
 
     required_groups = required_term_groups(user_message)
-    if required_groups and not sources_cover_terms(hits, required_groups):
-        return (
+    if required_groups and not sources_cover_terms(hits, required_groups, index.lexical):
+        return AgentTurn(
             "Je n'ai pas trouvé de sources EPITECH qui mentionnent clairement ces termes. "
             "Peux-tu préciser ou reformuler ?",
             [],
         )
     sources_block, sources = build_sources(hits)
     if not sources:
-        return (
+        return AgentTurn(
             "Je n'ai pas trouvé de sources pertinentes sur le site EPITECH pour cette question. "
             "Peux-tu reformuler ou préciser ?",
             [],
@@ -537,8 +646,8 @@ async def run_agent(user_message: str, session_id: str) -> Tuple[str, List[Dict[
         pge_answer = extract_pge_answer(hits)
         if pge_answer:
             history.append(("assistant", pge_answer))
-            conversations[session_id] = history
-            return pge_answer, sources
+            await sessions.set_async(session_id, history)
+            return AgentTurn(pge_answer, sources)
 
     # Prompt final
     prompt = (
@@ -551,22 +660,27 @@ async def run_agent(user_message: str, session_id: str) -> Tuple[str, List[Dict[
         + "Assistant :"
     )
 
-    try:
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(
-                f"{OLLAMA_BASE_URL}/api/generate",
-                json={
-                "model": OLLAMA_CHAT_MODEL,
-                "prompt": prompt,
-                "stream": False,
-            },
-            timeout=120,
+    cache_key = None
+    if not should_include_history(user_message):
+        # la reponse ne depend que de la question et des extraits : reutilisable
+        cache_key = (
+            normalize_query(user_message),
+            tuple(hit.get("id") for hit in hits),
+            snapshot.generation,
+            OLLAMA_CHAT_MODEL,
         )
-        resp.raise_for_status()
-        data = resp.json()
-        answer = data.get("response", "").strip()
-    except (httpx.HTTPError, ValueError):
-        answer = ""
+        cached = answer_cache.get(cache_key)
+        if cached is not None:
+            history.append(("assistant", cached))
+            await sessions.set_async(session_id, history)
+            return AgentTurn(cached, sources)
+
+    return AgentTurn("", sources, prompt=prompt, history=history, cache_key=cache_key)
+
+
+async def finish_turn(session_id: str, turn: AgentTurn, answer: str) -> str:
+    if answer and turn.cache_key is not None:
+        answer_cache.set(turn.cache_key, answer)
     if not answer:
         answer = (
             "Je n'ai pas trouvé d'information fiable dans les sources EPITECH indexées. "
@@ -574,7 +688,101 @@ async def run_agent(user_message: str, session_id: str) -> Tuple[str, List[Dict[
         )
 
     # Ajout à l'historique
+    history = turn.history if turn.history is not None else await sessions.get_async(session_id)
     history.append(("assistant", answer))
-    conversations[session_id] = history
-
+    await sessions.set_async(session_id, history)
+    return answer
+
+
+def flight_key(user_message: str) -> Tuple[str, str] | None:
+    # meme condition que le cache de reponses : sans historique, la reponse ne depend que de la question
+    if should_include_history(user_message):
+        return None
+    return normalize_query(user_message), OLLAMA_CHAT_MODEL
+
+
+async def record_exchange(session_id: str, user_message: str, answer: str) -> None:
+    """Historique d'une requete servie par le calcul d'une autre session."""
+    history = await sessions.get_async(session_id)
+    history.append(("user", user_message))
+    history = history[-6:]
+    history.append(("assistant", answer))
+    await sessions.set_async(session_id, history)
+
+
+async def run_agent(user_message: str, session_id: str) -> Tuple[str, List[Dict[str, str]]]:
+    key = flight_key(user_message)
+    if key is None:
+        return await answer_turn(user_message, session_id)
+
+    async def compute() -> Tuple[Tuple[str, List[Dict[str, str]]], Dict[str, float]]:
+        # la tache du vol herite du contexte du premier appelant : ce sont ses temps par etape
+        result = await answer_turn(user_message, session_id)
+        return result, dict(request_timings() or {})
+
+    ((answer, sources), timings), shared = await answer_flights.do(key, compute)
+    if shared:
+        mark_coalesced(timings)
+        await record_exchange(session_id, user_message, answer)
     return answer, sources
+
+
+async def answer_turn(user_message: str, session_id: str) -> Tuple[str, List[Dict[str, str]]]:
+    turn = await prepare_turn(user_message, session_id)
+    if turn.prompt is None:
+        return turn.answer, turn.sources
+    async with generate_limiter.slot():
+        try:
+            with timed("generate"):
+                answer = await ollama_client.generate_async(turn.prompt, OLLAMA_CHAT_MODEL)
+        except (httpx.HTTPError, ValueError):
+            answer = ""
+    return await finish_turn(session_id, turn, answer), turn.sources
+
+
+async def run_agent_stream(user_message: str, session_id: str) -> AsyncIterator[Dict[str, object]]:
+    """
+    Variante streaming de run_agent : envoie les sources des que le retrieval
+    est termine, puis les tokens du LLM au fil de l'eau.
+    """
+    key = flight_key(user_message)
+    if key is None:
+        events = stream_turn(user_message, session_id)
+        shared = False
+    else:
+        events, shared = stream_flights.stream(key, lambda: stream_turn(user_message, session_id))
+        if shared:
+            mark_coalesced()
+    try:
+        async for event in events:
+            if shared and event["type"] == "done":
+                await record_exchange(session_id, user_message, event["answer"])
+            yield event
+    finally:
+        await events.aclose()
+
+
+async def stream_turn(user_message: str, session_id: str) -> AsyncIterator[Dict[str, object]]:
+    turn = await prepare_turn(user_message, session_id)
+    if turn.prompt is None:
+        yield {"type": "sources", "sources": turn.sources}
+        yield {"type": "token", "text": turn.answer}
+        yield {"type": "done", "answer": turn.answer}
+        return
+
+    parts: List[str] = []
+    # place reservee avant le premier evenement : une file pleine donne un 503, pas un stream coupe
+    async with generate_limiter.slot():
+        yield {"type": "sources", "sources": turn.sources}
+        try:
+            with timed("generate"):
+                async for token in ollama_client.generate_stream(turn.prompt, OLLAMA_CHAT_MODEL):
+                    parts.append(token)
+                    yield {"type": "token", "text": token}
+        except (httpx.HTTPError, ValueError):
+            pass
+    generated = "".join(parts).strip()
+    answer = await finish_turn(session_id, turn, generated)
+    if not generated:
+        yield {"type": "token", "text": answer}
+    yield {"type": "done", "answer": answer}
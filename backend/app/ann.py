@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+import math
+import os
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+
+ANN_FILE = "ivf.npz"
+ANN_THRESHOLD = int(os.getenv("RAG_ANN_THRESHOLD", "20000"))
+ANN_NPROBE = int(os.getenv("RAG_ANN_NPROBE", "8"))
+ANN_ENABLED = os.getenv("RAG_ANN", "1") != "0"
+
+
+class IVFIndex:
+    """Partitions IVF : centroides normalises + lignes triees par liste."""
+
+    def __init__(self, centroids: np.ndarray, order: np.ndarray, offsets: np.ndarray) -> None:
+        self.centroids = centroids
+        self.order = order
+        self.offsets = offsets
+
+    @property
+    def nlist(self) -> int:
+        return int(self.centroids.shape[0])
+
+    def probe(self, query: np.ndarray, nprobe: int = ANN_NPROBE) -> np.ndarray:
+        nprobe = max(1, min(nprobe, self.nlist))
+        centroid_scores = self.centroids @ query
+        if nprobe < self.nlist:
+            lists = np.argpartition(-centroid_scores, nprobe - 1)[:nprobe]
+        else:
+            lists = np.arange(self.nlist)
+        parts = [self.order[self.offsets[lst] : self.offsets[lst + 1]] for lst in lists]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate(parts).astype(np.int64, copy=False)
+
+    def save(self, path: Path) -> None:
+        np.savez(path / ANN_FILE, centroids=self.centroids, order=self.order, offsets=self.offsets)
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFIndex | None":
+        ann_path = path / ANN_FILE
+        if not ann_path.exists():
+            return None
+        with np.load(ann_path) as data:
+            return cls(data["centroids"], data["order"], data["offsets"])
+
+
+def default_nlist(count: int) -> int:
+    return max(1, min(4096, int(4 * math.sqrt(count))))
+
+
+def assign_lists(matrix: np.ndarray, centroids: np.ndarray, batch_size: int = 8192) -> np.ndarray:
+    labels = np.empty(matrix.shape[0], dtype=np.int32)
+    for start in range(0, matrix.shape[0], batch_size):
+        block = np.asarray(matrix[start : start + batch_size], dtype=np.float32)
+        labels[start : start + block.shape[0]] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def build_ivf(
+    matrix: np.ndarray,
+    nlist: int | None = None,
+    iterations: int = 10,
+    max_train: int = 50000,
+    seed: int = 0,
+) -> IVFIndex:
+    """K-means spherique sur les lignes normalisees, puis affectation de toutes les lignes."""
+    count = matrix.shape[0]
+    nlist = min(nlist or default_nlist(count), count)
+    rng = np.random.default_rng(seed)
+    train_rows = rng.choice(count, size=min(count, max_train), replace=False)
+    train = np.asarray(matrix[np.sort(train_rows)], dtype=np.float32)
+    centroids = train[rng.choice(train.shape[0], size=nlist, replace=False)].copy()
+
+    for _ in range(iterations):
+        labels = assign_lists(train, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, labels, train)
+        sizes = np.bincount(labels, minlength=nlist)
+        empty = np.flatnonzero(sizes == 0)
+        if empty.size:
+            sums[empty] = train[rng.choice(train.shape[0], size=empty.size, replace=False)]
+        norms = np.linalg.norm(sums, axis=1, keepdims=True)
+        norms[norms == 0.0] = 1.0
+        centroids = sums / norms
+
+    labels = assign_lists(matrix, centroids)
+    order = np.argsort(labels, kind="stable").astype(np.int32)
+    offsets = np.zeros(nlist + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=nlist), out=offsets[1:])
+    return IVFIndex(centroids.astype(np.float32), order, offsets)
+
+
+def evaluate_recall(
+    matrix: np.ndarray,
+    ivf: IVFIndex,
+    top_k: int = 10,
+    nprobe_values: List[int] | None = None,
+    queries: int = 200,
+    noise: float = 0.05,
+    seed: int = 0,
+) -> List[Dict[str, float]]:
+    """Recall@k de l'IVF par rapport a la recherche exacte, sur des requetes bruitees."""
+    top_k = min(top_k, matrix.shape[0])
+    rng = np.random.default_rng(seed)
+    rows = rng.choice(matrix.shape[0], size=min(queries, matrix.shape[0]), replace=False)
+    probes = np.asarray(matrix[rows], dtype=np.float32)
+    probes = probes + rng.normal(scale=noise, size=probes.shape).astype(np.float32)
+    probes /= np.maximum(np.linalg.norm(probes, axis=1, keepdims=True), 1e-12)
+
+    exact: List[set] = []
+    for query in probes:
+        scores = matrix @ query
+        exact.append(set(np.argpartition(-scores, top_k - 1)[:top_k].tolist()))
+
+    report: List[Dict[str, float]] = []
+    for nprobe in nprobe_values or [1, 2, 4, 8, 16, 32]:
+        found = 0
+        scanned = 0
+        for query, truth in zip(probes, exact):
+            hits, candidates = search_ivf(matrix, ivf, query, top_k, nprobe)
+            found += len(truth.intersection(hits.tolist()))
+            scanned += candidates
+        report.append(
+            {
+                "nprobe": nprobe,
+                "recall": found / (len(exact) * top_k),
+                "scanned_fraction": scanned / (len(exact) * matrix.shape[0]),
+            }
+        )
+    return report
+
+
+def search_ivf(
+    matrix: np.ndarray,
+    ivf: IVFIndex,
+    query: np.ndarray,
+    top_k: int,
+    nprobe: int = ANN_NPROBE,
+) -> Tuple[np.ndarray, int]:
+    candidates = ivf.probe(query, nprobe)
+    if not candidates.size:
+        return candidates, 0
+    scores = matrix[candidates] @ query
+    if top_k < scores.shape[0]:
+        best = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        best = np.arange(scores.shape[0])
+    return candidates[best], int(candidates.size)
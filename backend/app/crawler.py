@@ -1,16 +1,32 @@
 from __future__ import annotations
 
+import asyncio
 from collections import deque
-from typing import Iterable, Dict, List, Set
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import hashlib
+import heapq
+import os
+import queue
+import threading
+from typing import Callable, Iterable, Iterator, Dict, List, Set, Tuple
 from urllib.parse import urljoin, urlparse, urldefrag
 import re
 import time
 import xml.etree.ElementTree as ET
 
 import httpx
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, Tag
 
 
+USER_AGENT = "EpitechRAGBot/1.0 (+https://www.epitech.eu)"
+ROBOTS_AGENT = "EpitechRAGBot"
+
+# "links" : liens sortants de la page, suivis aussi quand elle est sautee comme inchangee
+PAGE_STATE_KEYS = ("etag", "last_modified", "lastmod", "hash", "links")
+
+BOILERPLATE_TAGS = {"script", "style", "noscript", "header", "footer", "nav", "aside"}
+
 IGNORED_EXTENSIONS = {
     ".pdf",
     ".jpg",
@@ -24,27 +40,82 @@ IGNORED_EXTENSIONS = {
 }
 
 
-def extract_text(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
-    for tag in soup(["script", "style", "noscript"]):
-        tag.decompose()
-    for tag in soup.find_all(["header", "footer", "nav", "aside"]):
+@dataclass
+class ParsedPage:
+    title: str
+    text: str
+    links: List[str]
+
+
+def detect_html_parser() -> str:
+    configured = os.getenv("CRAWLER_HTML_PARSER")
+    if configured:
+        return configured
+    try:
+        import lxml  # noqa: F401
+    except ImportError:
+        return "html.parser"
+    return "lxml"
+
+
+HTML_PARSER = detect_html_parser()
+
+
+def process_page(html: str, base_url: str, allowed_domain: str) -> ParsedPage:
+    """Un seul parsing par page : liens, titre puis texte principal."""
+    soup = BeautifulSoup(html, HTML_PARSER)
+    links = list(links_from_soup(soup, base_url, allowed_domain))
+    return ParsedPage(title=title_from_soup(soup), text=text_from_soup(soup), links=links)
+
+
+def is_boilerplate(tag: Tag) -> bool:
+    if tag.name in BOILERPLATE_TAGS:
+        return True
+    classes = tag.get("class")
+    if classes:
+        joined = " ".join(classes) if isinstance(classes, list) else classes
+        if "menu" in joined or "nav" in joined or "breadcrumb" in joined:
+            return True
+    element_id = tag.get("id")
+    return bool(element_id) and "menu" in element_id
+
+
+def text_from_soup(soup: BeautifulSoup) -> str:
+    # un seul parcours de l'arbre pour tout le contenu a retirer
+    for tag in soup.find_all(is_boilerplate):
         tag.decompose()
-    for element in soup.select("[class*='menu'], [class*='nav'], [class*='breadcrumb'], [id*='menu']"):
-        element.decompose()
     main = soup.find("main") or soup.find("article") or soup.body
     if not main:
         return ""
     return " ".join(main.stripped_strings)
 
 
-def extract_title(html: str) -> str:
-    soup = BeautifulSoup(html, "html.parser")
+def title_from_soup(soup: BeautifulSoup) -> str:
     if soup.title and soup.title.string:
         return soup.title.string.strip()
     return ""
 
 
+def links_from_soup(soup: BeautifulSoup, base_url: str, allowed_domain: str) -> Iterable[str]:
+    for link in soup.find_all("a", href=True):
+        href = link["href"].strip()
+        if href.startswith("mailto:") or href.startswith("tel:"):
+            continue
+        absolute = normalize_url(urljoin(base_url, href))
+        if should_skip(absolute):
+            continue
+        if is_allowed(absolute, allowed_domain):
+            yield absolute
+
+
+def extract_text(html: str) -> str:
+    return text_from_soup(BeautifulSoup(html, HTML_PARSER))
+
+
+def extract_title(html: str) -> str:
+    return title_from_soup(BeautifulSoup(html, HTML_PARSER))
+
+
 def normalize_url(url: str) -> str:
     url, _ = urldefrag(url)
     return url.rstrip("/")
@@ -65,16 +136,7 @@ def is_allowed(url: str, allowed_domain: str) -> bool:
 
 
 def collect_links(html: str, base_url: str, allowed_domain: str) -> Iterable[str]:
-    soup = BeautifulSoup(html, "html.parser")
-    for link in soup.find_all("a", href=True):
-        href = link["href"].strip()
-        if href.startswith("mailto:") or href.startswith("tel:"):
-            continue
-        absolute = normalize_url(urljoin(base_url, href))
-        if should_skip(absolute):
-            continue
-        if is_allowed(absolute, allowed_domain):
-            yield absolute
+    return links_from_soup(BeautifulSoup(html, HTML_PARSER), base_url, allowed_domain)
 
 
 def crawl_site(
@@ -83,55 +145,401 @@ def crawl_site(
     max_depth: int = 2,
     rate_limit_s: float = 1.0,
     use_sitemap: bool = True,
+    concurrency: int = 1,
+    parse_workers: int = 0,
+    known_pages: Dict[str, Dict[str, str]] | None = None,
+    on_page: Callable[[Dict[str, str]], None] | None = None,
 ) -> List[Dict[str, str]]:
+    """
+    Crawl BFS du site. Avec `known_pages` (manifeste d'un index existant), le crawl est
+    incremental : GET conditionnels, pages "unchanged" sans texte et pages "removed" (404/410).
+    Avec `on_page`, chaque page est passee au callback au lieu d'etre accumulee (liste vide).
+    """
     base = normalize_url(base_url)
     allowed_domain = urlparse(base).netloc
     visited: Set[str] = set()
-    queue = deque([(base, 0)])
+    frontier = deque([(base, 0)])
     pages: List[Dict[str, str]] = []
-
-    headers = {"User-Agent": "EpitechRAGBot/1.0 (+https://www.epitech.eu)"}
+    collected = 0
+
+    def emit(record: Dict[str, str]) -> None:
+        nonlocal collected
+        collected += 1
+        if on_page is not None:
+            on_page(record)
+        else:
+            pages.append(record)
+
+    if concurrency > 1:
+        return asyncio.run(
+            crawl_site_async(
+                base_url,
+                max_pages=max_pages,
+                max_depth=max_depth,
+                rate_limit_s=rate_limit_s,
+                use_sitemap=use_sitemap,
+                concurrency=concurrency,
+                parse_workers=parse_workers,
+                known_pages=known_pages,
+                on_page=on_page,
+            )
+        )
+
+    known = known_pages or {}
+    lastmods: Dict[str, str] = {}
+
+    def follow(links: Iterable[str], depth: int) -> None:
+        if depth < max_depth:
+            for link in links:
+                if link not in visited:
+                    frontier.append((link, depth + 1))
+
+    headers = {"User-Agent": USER_AGENT}
     with httpx.Client(follow_redirects=True, timeout=20, headers=headers) as client:
         if use_sitemap:
-            for url in fetch_sitemap_urls(base, allowed_domain, client, max_urls=max_pages * 3):
-                if url not in visited and len(queue) < max_pages * 3:
-                    queue.append((url, 0))
-
-        while queue and len(pages) < max_pages:
-            url, depth = queue.popleft()
+            for url in fetch_sitemap_urls(
+                base, allowed_domain, client, max_urls=max_pages * 3, lastmods=lastmods
+            ):
+                if url not in visited and len(frontier) < max_pages * 3:
+                    frontier.append((url, 0))
+        # les pages deja indexees sont revalidees meme si plus aucun lien n'y mene
+        for url in known:
+            frontier.append((url, 0))
+
+        while frontier and collected < max_pages:
+            url, depth = frontier.popleft()
             if url in visited or depth > max_depth:
                 continue
             visited.add(url)
 
+            state = known.get(url)
+            lastmod = lastmods.get(url, "")
+            if state and lastmod and state.get("lastmod") == lastmod:
+                emit(unchanged_record(url, state, lastmod))
+                follow(state.get("links") or [], depth)
+                continue
+
             try:
-                resp = client.get(url)
+                resp = client.get(url, headers=conditional_headers(state))
             except httpx.HTTPError:
                 continue
 
+            if state and resp.status_code == 304:
+                emit(unchanged_record(url, state, lastmod))
+                follow(state.get("links") or [], depth)
+                time.sleep(rate_limit_s)
+                continue
+            if state and resp.status_code in (404, 410):
+                emit({"url": url, "status": "removed"})
+                continue
+
             content_type = resp.headers.get("content-type", "")
             if resp.status_code != 200 or "text/html" not in content_type:
                 continue
 
-            html = resp.text
-            text = extract_text(html)
-            if text:
-                pages.append({"url": url, "title": extract_title(html), "text": text})
+            page = process_page(resp.text, url, allowed_domain)
+            if page.text:
+                emit(page_record(url, page, resp, lastmod))
+            follow(page.links, depth)
+
+            time.sleep(rate_limit_s)
+
+    return pages
+
+
+class TokenBucket:
+    """Limiteur token-bucket : `rate` jetons par seconde, rafale max `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        # le verrou est garde pendant l'attente : les requetes passent dans l'ordre d'arrivee
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+
+class HostRateLimiter:
+    """Un TokenBucket par hote, intervalle = max(--rate-limit, Crawl-delay du robots.txt)."""
+
+    def __init__(self, client: httpx.AsyncClient, rate_limit_s: float) -> None:
+        self.client = client
+        self.rate_limit_s = rate_limit_s
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lock = asyncio.Lock()
+
+    async def bucket_for(self, host: str, scheme: str = "https") -> TokenBucket:
+        async with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                delay = await fetch_crawl_delay(self.client, f"{scheme}://{host}")
+                interval = max(self.rate_limit_s, delay or 0.0)
+                bucket = TokenBucket(1.0 / interval if interval > 0 else 0.0)
+                self._buckets[host] = bucket
+            return bucket
+
+    async def wait(self, url: str) -> None:
+        parsed = urlparse(url)
+        bucket = await self.bucket_for(parsed.netloc, parsed.scheme or "https")
+        await bucket.acquire()
+
+
+def parse_crawl_delay(robots_txt: str, agent: str = ROBOTS_AGENT) -> float | None:
+    # urllib.robotparser n'accepte que des Crawl-delay entiers
+    delays: Dict[str, float] = {}
+    group_agents: List[str] = []
+    in_rules = False
+    for raw_line in robots_txt.splitlines():
+        line = raw_line.split("#", 1)[0].strip()
+        if ":" not in line:
+            continue
+        field, value = (part.strip() for part in line.split(":", 1))
+        field = field.lower()
+        if field == "user-agent":
+            if in_rules:
+                group_agents = []
+                in_rules = False
+            group_agents.append(value.lower())
+            continue
+        in_rules = True
+        if field == "crawl-delay":
+            try:
+                delay = float(value)
+            except ValueError:
+                continue
+            for name in group_agents:
+                delays.setdefault(name, delay)
+    agent = agent.lower()
+    for name, delay in delays.items():
+        if name != "*" and name in agent:
+            return delay
+    return delays.get("*")
+
+
+async def fetch_crawl_delay(client: httpx.AsyncClient, origin: str) -> float | None:
+    try:
+        resp = await client.get(urljoin(origin + "/", "robots.txt"))
+    except httpx.HTTPError:
+        return None
+    if resp.status_code != 200:
+        return None
+    return parse_crawl_delay(resp.text)
+
+
+class CrawlFrontier:
+    """File de priorite : profondeur BFS d'abord, puis url_priority, puis ordre de decouverte."""
+
+    def __init__(self) -> None:
+        self._heap: List[Tuple[int, int, int, str]] = []
+        self._seq = 0
 
+    def push(self, url: str, depth: int, priority: int | None = None) -> None:
+        if priority is None:
+            priority = url_priority(url)
+        heapq.heappush(self._heap, (depth, priority, self._seq, url))
+        self._seq += 1
+
+    def pop(self) -> Tuple[str, int]:
+        depth, _, _, url = heapq.heappop(self._heap)
+        return url, depth
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+async def crawl_site_async(
+    base_url: str,
+    max_pages: int = 80,
+    max_depth: int = 2,
+    rate_limit_s: float = 1.0,
+    use_sitemap: bool = True,
+    concurrency: int = 4,
+    parse_workers: int = 0,
+    known_pages: Dict[str, Dict[str, str]] | None = None,
+    on_page: Callable[[Dict[str, str]], None] | None = None,
+) -> List[Dict[str, str]]:
+    base = normalize_url(base_url)
+    allowed_domain = urlparse(base).netloc
+    visited: Set[str] = set()
+    frontier = CrawlFrontier()
+    frontier.push(base, 0, priority=-1)
+    pages: List[Dict[str, str]] = []
+    collected = 0
+
+    def emit(record: Dict[str, str]) -> None:
+        nonlocal collected
+        collected += 1
+        if on_page is not None:
+            on_page(record)
+        else:
+            pages.append(record)
+    in_flight = 0
+    wakeup = asyncio.Condition()
+    known = known_pages or {}
+    lastmods: Dict[str, str] = {}
+
+    headers = {"User-Agent": USER_AGENT}
+    async with httpx.AsyncClient(follow_redirects=True, timeout=20, headers=headers) as client:
+        limiter = HostRateLimiter(client, rate_limit_s)
+        if use_sitemap:
+            sitemap_urls = await fetch_sitemap_urls_async(
+                base, allowed_domain, client, limiter, max_urls=max_pages * 3, lastmods=lastmods
+            )
+            for url in sitemap_urls:
+                if len(frontier) < max_pages * 3:
+                    frontier.push(url, 0)
+        for url in known:
+            frontier.push(url, 0)
+
+        def follow(links: Iterable[str], depth: int) -> None:
             if depth < max_depth:
-                for link in collect_links(html, url, allowed_domain):
+                for link in links:
                     if link not in visited:
-                        queue.append((link, depth + 1))
-
-            time.sleep(rate_limit_s)
+                        frontier.push(link, depth + 1)
+
+        async def fetch(url: str, depth: int) -> None:
+            state = known.get(url)
+            lastmod = lastmods.get(url, "")
+            if state and lastmod and state.get("lastmod") == lastmod:
+                emit(unchanged_record(url, state, lastmod))
+                follow(state.get("links") or [], depth)
+                return
+            await limiter.wait(url)
+            try:
+                resp = await client.get(url, headers=conditional_headers(state))
+            except httpx.HTTPError:
+                return
+            if state and resp.status_code == 304:
+                emit(unchanged_record(url, state, lastmod))
+                follow(state.get("links") or [], depth)
+                return
+            if state and resp.status_code in (404, 410):
+                emit({"url": url, "status": "removed"})
+                return
+            content_type = resp.headers.get("content-type", "")
+            if resp.status_code != 200 or "text/html" not in content_type:
+                return
+            if parse_pool is not None:
+                # parsing dans un autre processus : il chevauche les fetchs en cours
+                page = await asyncio.get_running_loop().run_in_executor(
+                    parse_pool, process_page, resp.text, url, allowed_domain
+                )
+            else:
+                page = process_page(resp.text, url, allowed_domain)
+            if page.text and collected < max_pages:
+                emit(page_record(url, page, resp, lastmod))
+            follow(page.links, depth)
+
+        async def worker() -> None:
+            nonlocal in_flight
+            while True:
+                async with wakeup:
+                    while True:
+                        if collected >= max_pages:
+                            return
+                        if collected + in_flight >= max_pages:
+                            # assez de requetes en vol pour atteindre max_pages
+                            await wakeup.wait()
+                            continue
+                        while frontier:
+                            url, depth = frontier.pop()
+                            if url not in visited and depth <= max_depth:
+                                break
+                        else:
+                            url = ""
+                        if url:
+                            break
+                        if not in_flight:
+                            return
+                        await wakeup.wait()
+                    visited.add(url)
+                    in_flight += 1
+                try:
+                    await fetch(url, depth)
+                finally:
+                    async with wakeup:
+                        in_flight -= 1
+                        wakeup.notify_all()
+
+        parse_pool = ProcessPoolExecutor(max_workers=parse_workers) if parse_workers > 0 else None
+        try:
+            await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+        finally:
+            if parse_pool is not None:
+                parse_pool.shutdown()
 
     return pages
 
 
+class CrawlCancelled(Exception):
+    pass
+
+
+def iter_crawl_site(base_url: str, buffer: int = 32, **kwargs) -> Iterator[Dict[str, str]]:
+    """
+    Crawl dans un thread de fond, pages rendues au fil de l'eau. La file bornee
+    (`buffer` pages) freine le crawl quand le consommateur (embeddings) est plus lent.
+    """
+    pages: queue.Queue = queue.Queue(maxsize=max(1, buffer))
+    stop = threading.Event()
+    done = object()
+    failure: List[BaseException] = []
+
+    def put(item: object) -> None:
+        while not stop.is_set():
+            try:
+                pages.put(item, timeout=0.2)
+                return
+            except queue.Full:
+                continue
+        raise CrawlCancelled()
+
+    def produce() -> None:
+        try:
+            crawl_site(base_url, on_page=put, **kwargs)
+        except CrawlCancelled:
+            return
+        except BaseException as exc:  # remonte dans le thread consommateur
+            failure.append(exc)
+        try:
+            put(done)
+        except CrawlCancelled:
+            pass
+
+    thread = threading.Thread(target=produce, name="crawler", daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = pages.get()
+            if item is done:
+                break
+            yield item
+        if failure:
+            raise failure[0]
+    finally:
+        stop.set()
+        thread.join()
+
+
 def fetch_sitemap_urls(
     base_url: str,
     allowed_domain: str,
     client: httpx.Client,
     max_urls: int = 200,
+    lastmods: Dict[str, str] | None = None,
 ) -> List[str]:
     sitemap_urls = []
     candidates = [urljoin(base_url + "/", "sitemap_index.xml"), urljoin(base_url + "/", "sitemap.xml")]
@@ -156,10 +564,60 @@ def fetch_sitemap_urls(
             continue
         if resp.status_code != 200:
             continue
-        urls.extend(parse_sitemap(resp.text))
+        urls.extend(collect_sitemap_entries(resp.text, lastmods))
         if len(urls) >= max_urls:
             break
 
+    return select_sitemap_urls(urls, allowed_domain, max_urls)
+
+
+async def fetch_sitemap_urls_async(
+    base_url: str,
+    allowed_domain: str,
+    client: httpx.AsyncClient,
+    limiter: HostRateLimiter,
+    max_urls: int = 200,
+    lastmods: Dict[str, str] | None = None,
+) -> List[str]:
+    async def get(url: str) -> httpx.Response | None:
+        await limiter.wait(url)
+        try:
+            return await client.get(url)
+        except httpx.HTTPError:
+            return None
+
+    sitemap_urls = []
+    candidates = [urljoin(base_url + "/", "sitemap_index.xml"), urljoin(base_url + "/", "sitemap.xml")]
+    for candidate in candidates:
+        resp = await get(candidate)
+        if resp is None or resp.status_code != 200 or "xml" not in resp.headers.get("content-type", ""):
+            continue
+        sitemap_urls.extend(parse_sitemap(resp.text))
+        if sitemap_urls:
+            break
+
+    urls: List[str] = []
+    for sitemap_url in sorted(sitemap_urls, key=sitemap_priority):
+        if len(urls) >= max_urls:
+            break
+        resp = await get(sitemap_url)
+        if resp is None or resp.status_code != 200:
+            continue
+        urls.extend(collect_sitemap_entries(resp.text, lastmods))
+
+    return select_sitemap_urls(urls, allowed_domain, max_urls)
+
+
+def collect_sitemap_entries(xml_text: str, lastmods: Dict[str, str] | None = None) -> List[str]:
+    urls: List[str] = []
+    for loc, lastmod in parse_sitemap_entries(xml_text):
+        urls.append(loc)
+        if lastmods is not None and lastmod:
+            lastmods[normalize_url(loc)] = lastmod
+    return urls
+
+
+def select_sitemap_urls(urls: List[str], allowed_domain: str, max_urls: int) -> List[str]:
     if not urls:
         return []
 
@@ -180,16 +638,67 @@ def fetch_sitemap_urls(
 
 
 def parse_sitemap(xml_text: str) -> List[str]:
+    return [loc for loc, _ in parse_sitemap_entries(xml_text)]
+
+
+def parse_sitemap_entries(xml_text: str) -> List[Tuple[str, str]]:
+    """(loc, lastmod) pour chaque entree ; lastmod vaut "" s'il est absent."""
     try:
         root = ET.fromstring(xml_text)
     except ET.ParseError:
         return []
     ns = {"ns": "http://www.sitemaps.org/schemas/sitemap/0.9"}
     if root.tag.endswith("sitemapindex"):
-        return [loc.text.strip() for loc in root.findall("ns:sitemap/ns:loc", ns) if loc.text]
-    if root.tag.endswith("urlset"):
-        return [loc.text.strip() for loc in root.findall("ns:url/ns:loc", ns) if loc.text]
-    return []
+        items = root.findall("ns:sitemap", ns)
+    elif root.tag.endswith("urlset"):
+        items = root.findall("ns:url", ns)
+    else:
+        return []
+    entries: List[Tuple[str, str]] = []
+    for item in items:
+        loc = item.find("ns:loc", ns)
+        if loc is None or not loc.text:
+            continue
+        lastmod = item.find("ns:lastmod", ns)
+        entries.append((loc.text.strip(), (lastmod.text or "").strip() if lastmod is not None else ""))
+    return entries
+
+
+def page_fingerprint(title: str, text: str) -> str:
+    return hashlib.sha256(f"{title}\n{text}".encode("utf-8")).hexdigest()
+
+
+def conditional_headers(state: Dict[str, str] | None) -> Dict[str, str]:
+    if not state:
+        return {}
+    headers: Dict[str, str] = {}
+    if state.get("etag"):
+        headers["If-None-Match"] = state["etag"]
+    if state.get("last_modified"):
+        headers["If-Modified-Since"] = state["last_modified"]
+    return headers
+
+
+def unchanged_record(url: str, state: Dict[str, str], lastmod: str = "") -> Dict[str, str]:
+    record = {key: value for key, value in state.items() if key in PAGE_STATE_KEYS}
+    record.update({"url": url, "status": "unchanged"})
+    if lastmod:
+        record["lastmod"] = lastmod
+    return record
+
+
+def page_record(url: str, page: ParsedPage, resp: httpx.Response, lastmod: str = "") -> Dict[str, str]:
+    return {
+        "url": url,
+        "title": page.title,
+        "text": page.text,
+        "status": "fetched",
+        "etag": resp.headers.get("etag", ""),
+        "last_modified": resp.headers.get("last-modified", ""),
+        "lastmod": lastmod,
+        "hash": page_fingerprint(page.title, page.text),
+        "links": page.links,
+    }
 
 
 def sitemap_priority(url: str) -> int:
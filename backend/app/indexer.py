@@ -1,8 +1,27 @@
 import argparse
 from pathlib import Path
+import time
+from typing import Dict
 
-from .crawler import crawl_site
-from .rag import build_index, save_index
+from . import ollama_client
+from .ann import build_ivf, evaluate_recall
+from .crawler import iter_crawl_site
+from .embed_store import EMBED_STORE_MAX, EMBED_STORE_PATH, EmbeddingStore
+from .pipeline import StagedIndex, staging_path, stream_index
+from .rag import (
+    DEFAULT_EMBED_MODEL,
+    EMBED_BATCH_SIZE,
+    EMBED_CONCURRENCY,
+    EMBED_RETRIES,
+    VectorIndex,
+    build_lexical,
+    is_jsonl_path,
+    load_index,
+    load_page_manifest,
+    merge_index,
+    publish_manifest,
+    save_index,
+)
 
 
 def parse_args() -> argparse.Namespace:
@@ -11,38 +30,223 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--max-pages", type=int, default=80)
     parser.add_argument("--max-depth", type=int, default=2)
     parser.add_argument("--rate-limit", type=float, default=1.0)
-    parser.add_argument("--output", default="rag_index.jsonl")
+    parser.add_argument(
+        "--output",
+        default="rag_index",
+        help="Index directory (binary format), or a .jsonl file for the legacy JSONL format.",
+    )
     parser.add_argument("--chunk-size", type=int, default=1200)
     parser.add_argument("--overlap", type=int, default=200)
     parser.add_argument("--max-chunks-per-page", type=int, default=8)
     parser.add_argument("--no-sitemap", action="store_true", help="Disable sitemap-based seeding.")
+    parser.add_argument(
+        "--crawl-concurrency",
+        type=int,
+        default=1,
+        help="Concurrent fetches; above 1 uses the asyncio crawler with a per-host rate limiter.",
+    )
+    parser.add_argument(
+        "--parse-workers",
+        type=int,
+        default=0,
+        help="HTML parsing processes for the asyncio crawler (0 parses in the event loop).",
+    )
+    parser.add_argument(
+        "--embed-batch-size",
+        type=int,
+        default=EMBED_BATCH_SIZE,
+        help="Chunks sent per /api/embed request.",
+    )
+    parser.add_argument(
+        "--embed-concurrency",
+        type=int,
+        default=EMBED_CONCURRENCY,
+        help="Embedding batches in flight at once.",
+    )
+    parser.add_argument(
+        "--embed-retries",
+        type=int,
+        default=EMBED_RETRIES,
+        help="Retries with exponential backoff for a failed batch.",
+    )
+    parser.add_argument(
+        "--embed-cache",
+        default=EMBED_STORE_PATH,
+        help="SQLite embedding cache reused across builds.",
+    )
+    parser.add_argument("--embed-cache-max", type=int, default=EMBED_STORE_MAX, help="Max cached embeddings.")
+    parser.add_argument("--no-embed-cache", action="store_true", help="Disable the on-disk embedding cache.")
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Re-embed only pages that changed since the index at --output was built; prune removed pages.",
+    )
+    parser.add_argument(
+        "--restart",
+        action="store_true",
+        help="Ignore the checkpoint of an interrupted build and start from scratch.",
+    )
+    parser.add_argument(
+        "--from-index",
+        help="Convert an existing index (directory or .jsonl) to --output instead of crawling.",
+    )
+    parser.add_argument(
+        "--ann",
+        action="store_true",
+        help="Build IVF partitions for approximate search (used above RAG_ANN_THRESHOLD chunks).",
+    )
+    parser.add_argument(
+        "--no-bm25",
+        action="store_true",
+        help="Do not store the BM25 lexical index (hybrid search, lexical pre-filter).",
+    )
+    parser.add_argument("--ann-lists", type=int, default=0, help="Number of IVF lists (default: 4*sqrt(n)).")
+    parser.add_argument(
+        "--evaluate-ann",
+        action="store_true",
+        help="Report ANN recall@k against exact search on the index at --output, then exit.",
+    )
+    parser.add_argument("--eval-k", type=int, default=10)
     return parser.parse_args()
 
 
+def evaluate_ann(index_path: Path, nlist: int, top_k: int) -> None:
+    index = load_index(index_path)
+    if not len(index):
+        raise SystemExit(f"No index entries found in {index_path}.")
+    ivf = index.ann or build_ivf(index.matrix, nlist=nlist or None)
+    print(f"{len(index)} chunks, {ivf.nlist} IVF lists, recall@{top_k} against exact search:")
+    for row in evaluate_recall(index.matrix, ivf, top_k=top_k):
+        print(
+            f"  nprobe={row['nprobe']:<4} recall={row['recall']:.3f} "
+            f"scanned={row['scanned_fraction']:.1%}"
+        )
+
+
 def main() -> None:
     args = parse_args()
-    pages = crawl_site(
+    try:
+        run(args)
+    finally:
+        ollama_client.close()
+
+
+def run(args: argparse.Namespace) -> None:
+    output_path = Path(args.output)
+
+    if args.evaluate_ann:
+        evaluate_ann(output_path, args.ann_lists, args.eval_k)
+        return
+
+    if args.from_index:
+        index = load_index(Path(args.from_index))
+        if not len(index):
+            raise SystemExit(f"No index entries found in {args.from_index}.")
+        if args.ann:
+            index.ann = build_ivf(index.matrix, nlist=args.ann_lists or None)
+        if index.lexical is None and not args.no_bm25 and not is_jsonl_path(output_path):
+            index.lexical = build_lexical(index)
+        # l'etat du crawl suit l'index converti (le --incremental suivant reste incremental)
+        save_index(index, output_path, manifest=load_page_manifest(Path(args.from_index)) or None)
+        print(f"Index converted to {output_path} ({len(index)} chunks).")
+        return
+
+    previous = VectorIndex.from_entries([])
+    manifest: Dict[str, Dict[str, str]] = {}
+    if args.incremental:
+        if is_jsonl_path(output_path):
+            raise SystemExit("--incremental needs the binary index format (directory --output).")
+        previous = load_index(output_path)
+        manifest = load_page_manifest(output_path)
+        if not len(previous):
+            manifest = {}
+            print(f"No existing index at {output_path}; running a full build.")
+
+    settings = {
+        "base_url": args.base_url,
+        "chunk_size": args.chunk_size,
+        "overlap": args.overlap,
+        "max_chunks_per_page": args.max_chunks_per_page,
+        "embed_model": DEFAULT_EMBED_MODEL,
+        "incremental": bool(manifest),
+    }
+    staged = StagedIndex(staging_path(output_path), settings, resume=not args.restart)
+    if staged.resumed:
+        print(f"Resuming from {staged.path}: {len(staged.pages)} pages, {staged.rows} chunks already embedded.")
+
+    pages = iter_crawl_site(
         args.base_url,
         max_pages=args.max_pages,
         max_depth=args.max_depth,
         rate_limit_s=args.rate_limit,
         use_sitemap=not args.no_sitemap,
+        concurrency=args.crawl_concurrency,
+        parse_workers=args.parse_workers,
+        known_pages=manifest or None,
     )
-    if not pages:
+    store = None if args.no_embed_cache else EmbeddingStore(args.embed_cache, args.embed_cache_max)
+    started = time.perf_counter()
+    try:
+        stats = stream_index(
+            pages,
+            staged,
+            manifest,
+            chunk_size=args.chunk_size,
+            overlap=args.overlap,
+            max_chunks_per_page=args.max_chunks_per_page,
+            batch_size=args.embed_batch_size,
+            concurrency=args.embed_concurrency,
+            retries=args.embed_retries,
+            store=store,
+        )
+    finally:
+        staged.close()
+        if store is not None:
+            store.close()
+    elapsed = time.perf_counter() - started
+    if not stats.pages:
         raise SystemExit("No pages collected. Check base URL or crawl limits.")
+    if stats.chunks:
+        print(f"Embedded {stats.chunks} chunks in {elapsed:.1f}s ({stats.chunks / max(elapsed, 1e-9):.1f} chunks/s).")
+    if stats.skipped:
+        print(f"Skipped {stats.skipped} pages already embedded before the interruption.")
+    if store is not None and store.hits + store.misses:
+        print(f"Embedding cache: {store.hits} hits, {store.misses} misses ({args.embed_cache}).")
 
-    chunks = build_index(
-        pages,
-        chunk_size=args.chunk_size,
-        overlap=args.overlap,
-        max_chunks_per_page=args.max_chunks_per_page,
-    )
-    if not chunks:
+    next_manifest = {url: state for url, state in manifest.items() if url not in staged.removed}
+    next_manifest.update(staged.pages)
+    if args.incremental and len(previous):
+        unchanged = len(staged.pages) - len(staged.changed)
+        print(
+            f"Incremental crawl: {len(staged.changed)} changed, {len(staged.removed)} removed, "
+            f"{unchanged} unchanged pages."
+        )
+        if not staged.changed and not staged.removed:
+            # la generation publiee reste immuable : le nouveau pages.json part dans une nouvelle
+            publish_manifest(output_path, next_manifest)
+            staged.discard()
+            print(f"Index at {output_path} is up to date ({len(previous)} chunks).")
+            return
+
+    # seules les pages modifiees ou supprimees perdent leurs anciens chunks
+    stale = staged.removed | staged.changed
+    keep_rows = [row for row, url in enumerate(previous.urls()) if url not in stale]
+    added = staged.to_index()
+    # build complet : la matrice reste mappee depuis le staging, sans copie en memoire
+    index = merge_index(previous, keep_rows, added) if keep_rows else added
+    if not len(index):
         raise SystemExit("No index chunks created. Check embedding model availability.")
 
-    output_path = Path(args.output)
-    save_index(chunks, output_path)
-    print(f"Index saved to {output_path} ({len(chunks)} chunks).")
+    if not args.no_bm25 and not is_jsonl_path(output_path):
+        index.lexical = build_lexical(index)
+    if args.ann or previous.ann is not None:
+        if is_jsonl_path(output_path):
+            print("ANN partitions are only stored with the binary index format; skipping.")
+        else:
+            index.ann = build_ivf(index.matrix, nlist=args.ann_lists or None)
+    save_index(index, output_path, manifest=next_manifest)
+    staged.discard()
+    print(f"Index saved to {output_path} ({len(index)} chunks).")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,159 @@
+from __future__ import annotations
+
+from collections import Counter
+import math
+import os
+from pathlib import Path
+import re
+from typing import Dict, Iterable, List, Sequence
+import unicodedata
+
+import numpy as np
+
+
+LEXICAL_DIR = "bm25"
+HYBRID_WEIGHT = float(os.getenv("RAG_HYBRID_WEIGHT", "0"))
+LEXICAL_PREFILTER = int(os.getenv("RAG_LEXICAL_PREFILTER", "0"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return TOKEN_RE.findall(stripped)
+
+
+class BM25Index:
+    """Index inverse BM25 : postings au format CSR (offsets par terme, lignes + frequences)."""
+
+    def __init__(
+        self,
+        terms: Sequence[str],
+        offsets: np.ndarray,
+        doc_ids: np.ndarray,
+        tfs: np.ndarray,
+        doc_len: np.ndarray,
+    ) -> None:
+        self.vocab: Dict[str, int] = {term: pos for pos, term in enumerate(terms)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        count = doc_len.shape[0]
+        self.avgdl = float(doc_len.mean()) if count else 0.0
+        df = np.diff(offsets).astype(np.float64)
+        self.idf = np.log(1.0 + (count - df + 0.5) / (df + 0.5)).astype(np.float32)
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "BM25Index":
+        vocab: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        tfs: List[int] = []
+        lengths: List[int] = []
+        for doc, text in enumerate(texts):
+            tokens = tokenize(text)
+            lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_ids.append(vocab.setdefault(term, len(vocab)))
+                doc_ids.append(doc)
+                tfs.append(tf)
+        term_array = np.asarray(term_ids, dtype=np.int64)
+        order = np.argsort(term_array, kind="stable")
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_array, minlength=len(vocab)), out=offsets[1:])
+        return cls(
+            list(vocab),
+            offsets,
+            np.asarray(doc_ids, dtype=np.int32)[order],
+            np.asarray(tfs, dtype=np.float32)[order],
+            np.asarray(lengths, dtype=np.float32),
+        )
+
+    def __len__(self) -> int:
+        return int(self.doc_len.shape[0])
+
+    def postings(self, term: str) -> np.ndarray:
+        pos = self.vocab.get(term)
+        if pos is None:
+            return np.zeros(0, dtype=np.int32)
+        return self.doc_ids[self.offsets[pos] : self.offsets[pos + 1]]
+
+    def document_frequency(self, term: str) -> int:
+        pos = self.vocab.get(term)
+        return 0 if pos is None else int(self.offsets[pos + 1] - self.offsets[pos])
+
+    def query_terms(self, query: str) -> List[int]:
+        return sorted({self.vocab[term] for term in tokenize(query) if term in self.vocab})
+
+    def scores(self, terms: List[int]) -> np.ndarray:
+        scores = np.zeros(len(self), dtype=np.float32)
+        if not terms or not self.avgdl:
+            return scores
+        for pos in terms:
+            start, end = self.offsets[pos], self.offsets[pos + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end]
+            norm = BM25_K1 * (1.0 - BM25_B + BM25_B * self.doc_len[docs] / self.avgdl)
+            scores[docs] += self.idf[pos] * tf * (BM25_K1 + 1.0) / (tf + norm)
+        return scores
+
+    def top_rows(self, terms: List[int], limit: int, scores: np.ndarray | None = None) -> np.ndarray:
+        if scores is None:
+            scores = self.scores(terms)
+        matched = np.flatnonzero(scores > 0.0)
+        if matched.size > limit:
+            matched = matched[np.argpartition(-scores[matched], limit - 1)[:limit]]
+        return np.sort(matched)
+
+    def rows_with_phrase(self, phrase: str, rows: Sequence[int]) -> np.ndarray:
+        """Lignes de `rows` contenant tous les mots de `phrase` (sans contrainte de position)."""
+        found = np.asarray(rows, dtype=self.doc_ids.dtype)
+        tokens = tokenize(phrase)
+        if not tokens:
+            return found[:0]
+        for token in tokens:
+            # postings triees par ligne : recherche dichotomique des lignes candidates, O(k log n) ;
+            # meme dtype que les postings, sinon numpy convertit toute la liste avant de chercher
+            postings = self.postings(token)
+            pos = np.searchsorted(postings, found)
+            present = pos < postings.size
+            present[present] = postings[pos[present]] == found[present]
+            found = found[present]
+            if not found.size:
+                break
+        return found
+
+    def save(self, path: Path) -> None:
+        # un .npy par tableau : les postings sont relus en memory-map (pages partagees entre workers)
+        lexical_path = path / LEXICAL_DIR
+        lexical_path.mkdir(parents=True, exist_ok=True)
+        np.save(lexical_path / "terms.npy", np.array(list(self.vocab), dtype=str))
+        np.save(lexical_path / "offsets.npy", self.offsets)
+        np.save(lexical_path / "doc_ids.npy", self.doc_ids)
+        np.save(lexical_path / "tfs.npy", self.tfs)
+        np.save(lexical_path / "doc_len.npy", self.doc_len)
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index | None":
+        lexical_path = path / LEXICAL_DIR
+        if not (lexical_path / "terms.npy").exists():
+            return None
+        return cls(
+            np.load(lexical_path / "terms.npy").tolist(),
+            np.load(lexical_path / "offsets.npy", mmap_mode="r"),
+            np.load(lexical_path / "doc_ids.npy", mmap_mode="r"),
+            np.load(lexical_path / "tfs.npy", mmap_mode="r"),
+            np.load(lexical_path / "doc_len.npy", mmap_mode="r"),
+        )
+
+
+def fuse_scores(dense: np.ndarray, lexical: np.ndarray, weight: float = HYBRID_WEIGHT) -> np.ndarray:
+    # le BM25 est ramene a [0, 1] puis ajoute au cosinus ; a n'utiliser que pour l'ordre, pas pour les seuils
+    top = float(lexical.max()) if lexical.size else 0.0
+    if weight <= 0.0 or top <= 0.0 or math.isnan(top):
+        return dense
+    return dense + weight * (lexical / top)
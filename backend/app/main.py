@@ -1,14 +1,44 @@
 # main.py
+import asyncio
+from contextlib import asynccontextmanager
+import json
 from pathlib import Path
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
-from .agent import run_agent  # logique IA dans agent.py
+from . import ollama_client
+from .admission import Overloaded
+from .agent import collect_metrics, index_reloader, run_agent, run_agent_stream, sessions  # logique IA dans agent.py
+from .metrics import render_metrics, server_timing, start_request_timings, timed
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # client Ollama partage (pool keep-alive) pour toute la duree de vie de l'app
+    await ollama_client.startup()
+    # index charge avant la premiere requete, puis surveille par un thread de fond
+    await asyncio.to_thread(index_reloader.reload)
+    index_reloader.start()
+    yield
+    index_reloader.stop()
+    await ollama_client.shutdown()
+    sessions.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    # file d'attente Ollama pleine : refus immediat, le client reessaie plus tard
+    return JSONResponse(
+        {"detail": f"Server busy ({exc.stage}), retry later."},
+        status_code=503,
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 
 class ChatRequest(BaseModel):
@@ -31,13 +61,50 @@ def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics")
+def metrics():
+    # format texte Prometheus, par processus (chaque worker uvicorn expose ses propres series)
+    collect_metrics()
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat(req: ChatRequest):
+async def chat(req: ChatRequest, response: Response):
     # Appel à la logique d'agent qui utilise Ollama
-    answer, sources = await run_agent(req.message, req.session_id)
+    timings = start_request_timings()
+    with timed("total"):
+        answer, sources = await run_agent(req.message, req.session_id)
+    # detail par etape visible dans l'onglet reseau des devtools
+    response.headers["Server-Timing"] = server_timing(timings)
     return ChatResponse(answer=answer, sources=[Source(**s) for s in sources])
 
 
+@app.post("/chat/stream")
+async def chat_stream(req: ChatRequest):
+    # NDJSON : {"type": "sources"} puis {"type": "token"}... puis {"type": "done"}
+    timings = start_request_timings()
+    stream = run_agent_stream(req.message, req.session_id)
+    # premier evenement attendu avant d'envoyer les en-tetes : Overloaded donne encore un 503
+    with timed("first_event"):
+        first = await stream.__anext__()
+
+    async def events():
+        try:
+            yield json.dumps(first, ensure_ascii=False) + "\n"
+            async for event in stream:
+                yield json.dumps(event, ensure_ascii=False) + "\n"
+        finally:
+            # client deconnecte : libere tout de suite la place de generation
+            await stream.aclose()
+
+    # Server-Timing : etapes terminees avant le premier evenement (retrieval, rerank), pas la generation
+    return StreamingResponse(
+        events(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no", "Server-Timing": server_timing(timings)},
+    )
+
+
 ROOT_DIR = Path(__file__).resolve().parents[2]
 SITE_DIR = ROOT_DIR / "frontend" / "site"
 
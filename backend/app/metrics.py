@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+import math
+import threading
+import time
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+
+# secondes : des etapes en memoire (~ms) jusqu'a la generation LLM (timeout 120 s)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def format_labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class Metric:
+    """Compteur ou jauge au format texte Prometheus, une serie par combinaison de labels."""
+
+    def __init__(self, name: str, help_text: str, kind: str = "counter", labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, value: float, **labels: str) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}")
+        return lines
+
+
+class Histogram(Metric):
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = STAGE_BUCKETS,
+    ) -> None:
+        super().__init__(name, help_text, "histogram", labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, totals = self._series.setdefault(key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for pos, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[pos] += 1
+                    break
+            else:
+                counts[-1] += 1
+            totals[0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, totals) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (math.inf,), counts):
+                    cumulative += count
+                    labels = format_labels(self.labelnames, key, f'le="{format_value(bound)}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(self.labelnames, key)
+                lines.append(f"{self.name}_sum{labels} {format_value(totals[0])}")
+                lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+# metriques du processus (un worker uvicorn = une serie, a agreger cote Prometheus)
+stage_seconds = Histogram("rag_stage_seconds", "Duration of each /chat pipeline stage.", ["stage"])
+ollama_errors = Metric("rag_ollama_errors_total", "Failed Ollama calls by operation.", "counter", ["operation"])
+index_chunks = Metric("rag_index_chunks", "Chunks in the served index.", "gauge")
+index_generation = Metric("rag_index_generation", "Index reloads since the process started.", "gauge")
+cache_hits = Metric("rag_cache_hits_total", "Cache hits.", "counter", ["cache"])
+cache_misses = Metric("rag_cache_misses_total", "Cache misses.", "counter", ["cache"])
+cache_hit_ratio = Metric("rag_cache_hit_ratio", "Cache hits / lookups since start.", "gauge", ["cache"])
+cache_entries = Metric("rag_cache_entries", "Entries currently cached.", "gauge", ["cache"])
+sessions_active = Metric("rag_sessions", "Conversation sessions stored.", "gauge")
+admission_rejected = Metric("rag_admission_rejected_total", "Calls refused by admission control.", "counter", ["stage"])
+admission_active = Metric("rag_admission_active", "Ollama calls in flight by stage.", "gauge", ["stage"])
+admission_waiting = Metric("rag_admission_waiting", "Calls waiting for an Ollama slot by stage.", "gauge", ["stage"])
+singleflight_shared = Metric(
+    "rag_singleflight_shared_total", "Requests answered by an identical in-flight request.", "counter", ["flight"]
+)
+singleflight_inflight = Metric("rag_singleflight_inflight", "Distinct questions being answered.", "gauge", ["flight"])
+REGISTRY: List[Metric] = [
+    stage_seconds,
+    ollama_errors,
+    index_chunks,
+    index_generation,
+    cache_hits,
+    cache_misses,
+    cache_hit_ratio,
+    cache_entries,
+    sessions_active,
+    admission_rejected,
+    admission_active,
+    admission_waiting,
+    singleflight_shared,
+    singleflight_inflight,
+]
+
+
+def render_metrics() -> str:
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# temps par etape de la requete en cours (en-tete Server-Timing) ; None hors d'une requete
+_request_timings: ContextVar[Dict[str, float] | None] = ContextVar("request_timings", default=None)
+
+
+def start_request_timings() -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+@contextmanager
+def timed(stage: str) -> Iterator[None]:
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        stage_seconds.observe(elapsed, stage=stage)
+        timings = _request_timings.get()
+        if timings is not None:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+
+
+def request_timings() -> Dict[str, float] | None:
+    return _request_timings.get()
+
+
+def mark_coalesced(leader: Dict[str, float] | None = None) -> None:
+    # requete servie par le calcul d'une autre : ses etapes (si connues) + une entree "coalesced"
+    timings = _request_timings.get()
+    if timings is None:
+        return
+    for stage, elapsed in (leader or {}).items():
+        timings.setdefault(stage, elapsed)
+    timings["coalesced"] = 0.0
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    return ", ".join(f"{stage};dur={elapsed * 1000:.1f}" for stage, elapsed in timings.items())
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import asyncio
+from contextlib import contextmanager
+import json
+import os
+import threading
+from typing import AsyncIterator, Iterator, List
+
+import httpx
+
+from .metrics import ollama_errors
+
+
+OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
+MAX_CONNECTIONS = int(os.getenv("OLLAMA_MAX_CONNECTIONS", "16"))
+MAX_KEEPALIVE = int(os.getenv("OLLAMA_MAX_KEEPALIVE", "8"))
+KEEPALIVE_EXPIRY = float(os.getenv("OLLAMA_KEEPALIVE_EXPIRY", "30"))
+CONNECT_TIMEOUT = float(os.getenv("OLLAMA_CONNECT_TIMEOUT", "5"))
+EMBED_TIMEOUT = float(os.getenv("OLLAMA_EMBED_TIMEOUT", "60"))
+RERANK_TIMEOUT = float(os.getenv("OLLAMA_RERANK_TIMEOUT", "60"))
+GENERATE_TIMEOUT = float(os.getenv("OLLAMA_GENERATE_TIMEOUT", "120"))
+
+_client: httpx.Client | None = None
+_client_lock = threading.Lock()
+_async_client: httpx.AsyncClient | None = None
+_async_loop: asyncio.AbstractEventLoop | None = None
+
+
+def pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+
+
+def operation_timeout(read_timeout: float) -> httpx.Timeout:
+    return httpx.Timeout(read_timeout, connect=CONNECT_TIMEOUT)
+
+
+def get_client() -> httpx.Client:
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = httpx.Client(base_url=OLLAMA_BASE_URL, limits=pool_limits())
+    return _client
+
+
+def get_async_client() -> httpx.AsyncClient:
+    # un AsyncClient est lie a l'event loop qui l'a cree
+    global _async_client, _async_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _async_loop is not loop:
+        _async_client = httpx.AsyncClient(base_url=OLLAMA_BASE_URL, limits=pool_limits())
+        _async_loop = loop
+    return _async_client
+
+
+async def startup() -> None:
+    get_async_client()
+
+
+async def shutdown() -> None:
+    global _async_client, _async_loop
+    if _async_client is not None:
+        await _async_client.aclose()
+    _async_client = None
+    _async_loop = None
+    close()
+
+
+def close() -> None:
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+
+
+@contextmanager
+def count_errors(operation: str) -> Iterator[None]:
+    # erreurs reseau, HTTP et reponses illisibles, exposees sur /metrics
+    try:
+        yield
+    except (httpx.HTTPError, ValueError):
+        ollama_errors.inc(operation=operation)
+        raise
+
+
+def embed(text: str, model: str) -> List[float]:
+    with count_errors("embed"):
+        resp = get_client().post(
+            "/api/embeddings",
+            json={"model": model, "prompt": text},
+            timeout=operation_timeout(EMBED_TIMEOUT),
+        )
+        resp.raise_for_status()
+        return resp.json().get("embedding", [])
+
+
+async def embed_async(text: str, model: str) -> List[float]:
+    with count_errors("embed"):
+        resp = await get_async_client().post(
+            "/api/embeddings",
+            json={"model": model, "prompt": text},
+            timeout=operation_timeout(EMBED_TIMEOUT),
+        )
+        resp.raise_for_status()
+        return resp.json().get("embedding", [])
+
+
+def generate(prompt: str, model: str, timeout: float = GENERATE_TIMEOUT, operation: str = "generate") -> str:
+    with count_errors(operation):
+        resp = get_client().post(
+            "/api/generate",
+            json={"model": model, "prompt": prompt, "stream": False},
+            timeout=operation_timeout(timeout),
+        )
+        resp.raise_for_status()
+        return resp.json().get("response", "").strip()
+
+
+async def generate_async(
+    prompt: str,
+    model: str,
+    timeout: float = GENERATE_TIMEOUT,
+    operation: str = "generate",
+) -> str:
+    with count_errors(operation):
+        resp = await get_async_client().post(
+            "/api/generate",
+            json={"model": model, "prompt": prompt, "stream": False},
+            timeout=operation_timeout(timeout),
+        )
+        resp.raise_for_status()
+        return resp.json().get("response", "").strip()
+
+
+async def generate_stream(
+    prompt: str,
+    model: str,
+    timeout: float = GENERATE_TIMEOUT,
+) -> AsyncIterator[str]:
+    with count_errors("generate_stream"):
+        async with get_async_client().stream(
+            "POST",
+            "/api/generate",
+            json={"model": model, "prompt": prompt, "stream": True},
+            timeout=operation_timeout(timeout),
+        ) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                token = data.get("response", "")
+                if token:
+                    yield token
+                if data.get("done"):
+                    break
+
+
+def embed_batch(texts: List[str], model: str) -> List[List[float]]:
+    if not texts:
+        return []
+    with count_errors("embed_batch"):
+        resp = get_client().post(
+            "/api/embed",
+            json={"model": model, "input": texts},
+            timeout=operation_timeout(EMBED_TIMEOUT),
+        )
+        if resp.status_code != 404:
+            resp.raise_for_status()
+            embeddings = resp.json().get("embeddings", [])
+            if len(embeddings) != len(texts):
+                raise httpx.DecodingError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+            return embeddings
+    # Ollama < 0.3 : pas d'endpoint multi-input, un appel par texte
+    return [embed(text, model) for text in texts]
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+from dataclasses import dataclass, field
+import json
+import os
+from pathlib import Path
+import shutil
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+import numpy as np
+
+from .crawler import PAGE_STATE_KEYS
+from .embed_store import EmbeddingStore
+from .rag import (
+    DEFAULT_EMBED_MODEL,
+    EMBED_BATCH_SIZE,
+    EMBED_CONCURRENCY,
+    EMBED_RETRIES,
+    VectorIndex,
+    embed_texts,
+    iter_page_chunks,
+    normalize_rows,
+)
+
+
+CHECKPOINT_FILE = "checkpoint.json"
+STAGE_VECTORS_FILE = "vectors.f32"
+STAGE_META_FILE = "meta.jsonl"
+STAGE_PAGES_FILE = "pages.jsonl"
+
+
+def staging_path(output_path: Path) -> Path:
+    return output_path.with_name(output_path.name + ".partial")
+
+
+class StagedIndex:
+    """
+    Chunks d'un build en cours, ajoutes sur disque au fil de l'eau (vecteurs float32 bruts
+    + meta.jsonl), avec un checkpoint qui permet de reprendre un build interrompu. L'etat des
+    pages est ajoute a un journal pages.jsonl : le checkpoint ne garde que les tailles a relire,
+    son cout ne grandit pas avec le crawl.
+    """
+
+    def __init__(self, path: Path, settings: Dict[str, Any], resume: bool = True) -> None:
+        self.path = path
+        self.settings = settings
+        self.rows = 0
+        self.dim = 0
+        self.meta_bytes = 0
+        self.pages_bytes = 0
+        self.pages: Dict[str, Dict[str, str]] = {}
+        self.changed: Set[str] = set()
+        self.removed: Set[str] = set()
+        self.resumed = False
+        if resume and (path / CHECKPOINT_FILE).exists():
+            self._restore()
+        if not self.resumed and path.exists():
+            shutil.rmtree(path)
+        path.mkdir(parents=True, exist_ok=True)
+        self._vectors = (path / STAGE_VECTORS_FILE).open("ab")
+        self._meta = (path / STAGE_META_FILE).open("ab")
+        self._pages = (path / STAGE_PAGES_FILE).open("ab")
+
+    def _restore(self) -> None:
+        checkpoint = json.loads((self.path / CHECKPOINT_FILE).read_text(encoding="utf-8"))
+        if checkpoint.get("settings") != self.settings:
+            print(f"Checkpoint in {self.path} was made with other settings; starting over.")
+            return
+        if "pages_bytes" not in checkpoint:
+            print(f"Checkpoint in {self.path} has no page journal; starting over.")
+            return
+        self.rows = checkpoint["rows"]
+        self.dim = checkpoint["dim"]
+        self.meta_bytes = checkpoint["meta_bytes"]
+        self.pages_bytes = checkpoint["pages_bytes"]
+        # un crash entre l'ecriture des donnees et celle du checkpoint laisse une fin orpheline
+        for name, size in (
+            (STAGE_VECTORS_FILE, self.rows * self.dim * 4),
+            (STAGE_META_FILE, self.meta_bytes),
+            (STAGE_PAGES_FILE, self.pages_bytes),
+        ):
+            with (self.path / name).open("r+b") as handle:
+                handle.truncate(size)
+        with (self.path / STAGE_PAGES_FILE).open("r", encoding="utf-8") as handle:
+            for line in handle:
+                self._apply(json.loads(line))
+        self.resumed = True
+
+    def _apply(self, record: Dict[str, Any]) -> None:
+        url = record["url"]
+        if record["status"] == "removed":
+            self.removed.add(url)
+            return
+        self.pages[url] = record["state"]
+        if record["status"] == "changed":
+            self.changed.add(url)
+
+    def is_done(self, url: str) -> bool:
+        return url in self.pages or url in self.removed
+
+    def append(
+        self,
+        pages: List[Tuple[Dict[str, str], str]],
+        entries: List[Dict[str, str]],
+        vectors: List[List[float]],
+    ) -> None:
+        if entries:
+            matrix = normalize_rows(np.asarray(vectors, dtype=np.float32))
+            if self.dim and matrix.shape[1] != self.dim:
+                raise ValueError(f"Embedding size changed during the build ({self.dim} -> {matrix.shape[1]})")
+            self.dim = int(matrix.shape[1])
+            self._vectors.write(matrix.tobytes())
+            payload = "".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries)
+            self._meta.write(payload.encode("utf-8"))
+            self.rows += len(entries)
+            self.meta_bytes += len(payload.encode("utf-8"))
+        if pages:
+            records = []
+            for page, status in pages:
+                record: Dict[str, Any] = {"url": page["url"], "status": status}
+                if status != "removed":
+                    record["state"] = {key: page.get(key, "") for key in PAGE_STATE_KEYS}
+                self._apply(record)
+                records.append(record)
+            payload = "".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records).encode("utf-8")
+            self._pages.write(payload)
+            self.pages_bytes += len(payload)
+        self.checkpoint()
+
+    def checkpoint(self) -> None:
+        # donnees sur disque avant le checkpoint qui les reference
+        for handle in (self._vectors, self._meta, self._pages):
+            handle.flush()
+            os.fsync(handle.fileno())
+        payload = {
+            "settings": self.settings,
+            "rows": self.rows,
+            "dim": self.dim,
+            "meta_bytes": self.meta_bytes,
+            "pages_bytes": self.pages_bytes,
+        }
+        tmp_path = self.path / (CHECKPOINT_FILE + ".tmp")
+        tmp_path.write_text(json.dumps(payload), encoding="utf-8")
+        os.replace(tmp_path, self.path / CHECKPOINT_FILE)
+
+    def to_index(self) -> VectorIndex:
+        if not self.rows:
+            return VectorIndex.from_entries([])
+        matrix = np.memmap(
+            self.path / STAGE_VECTORS_FILE, dtype=np.float32, mode="r", shape=(self.rows, self.dim)
+        )
+        entries: List[Dict[str, Any]] = []
+        with (self.path / STAGE_META_FILE).open("r", encoding="utf-8") as handle:
+            for row, line in enumerate(handle):
+                entry = json.loads(line)
+                entry["id"] = row
+                entries.append(entry)
+        return VectorIndex(entries, matrix)
+
+    def close(self) -> None:
+        self._vectors.close()
+        self._meta.close()
+        self._pages.close()
+
+    def discard(self) -> None:
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+@dataclass
+class PipelineStats:
+    pages: int = 0
+    skipped: int = 0
+    chunks: int = 0
+    statuses: Dict[str, int] = field(default_factory=dict)
+
+
+def page_status(page: Dict[str, str], manifest: Dict[str, Dict[str, str]]) -> str:
+    status = page.get("status", "fetched")
+    if status in ("removed", "unchanged"):
+        return status
+    if manifest.get(page["url"], {}).get("hash") == page.get("hash", ""):
+        return "unchanged"
+    return "changed"
+
+
+def stream_index(
+    pages: Iterable[Dict[str, str]],
+    staged: StagedIndex,
+    manifest: Dict[str, Dict[str, str]],
+    chunk_size: int = 1200,
+    overlap: int = 200,
+    max_chunks_per_page: int = 8,
+    embed_model: str = DEFAULT_EMBED_MODEL,
+    batch_size: int = EMBED_BATCH_SIZE,
+    concurrency: int = EMBED_CONCURRENCY,
+    retries: int = EMBED_RETRIES,
+    store: EmbeddingStore | None = None,
+) -> PipelineStats:
+    """
+    Pages -> chunks -> embeddings -> disque, par groupes d'environ batch_size * concurrency
+    chunks : la memoire reste bornee et chaque groupe termine est couvert par le checkpoint.
+    """
+    stats = PipelineStats()
+    group_size = max(1, batch_size * concurrency)
+    pending_pages: List[Tuple[Dict[str, str], str]] = []
+    pending_chunks: List[Dict[str, str]] = []
+
+    def flush() -> None:
+        vectors = embed_texts(
+            [entry["text"] for entry in pending_chunks],
+            model=embed_model,
+            batch_size=batch_size,
+            concurrency=concurrency,
+            retries=retries,
+            store=store,
+        )
+        kept = [(entry, vector) for entry, vector in zip(pending_chunks, vectors) if vector]
+        staged.append(pending_pages, [entry for entry, _ in kept], [vector for _, vector in kept])
+        stats.chunks += len(kept)
+        pending_pages.clear()
+        pending_chunks.clear()
+
+    for page in pages:
+        stats.pages += 1
+        if staged.is_done(page["url"]):
+            stats.skipped += 1
+            continue
+        status = page_status(page, manifest)
+        stats.statuses[status] = stats.statuses.get(status, 0) + 1
+        pending_pages.append((page, status))
+        if status == "changed":
+            for url, title, text in iter_page_chunks([page], chunk_size, overlap, max_chunks_per_page):
+                pending_chunks.append({"url": url, "title": title, "text": text})
+        if len(pending_chunks) >= group_size or len(pending_pages) >= group_size:
+            flush()
+    if pending_pages:
+        flush()
+    return stats
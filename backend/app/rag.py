@@ -1,18 +1,54 @@
 from __future__ import annotations
 
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+import hashlib
 import json
 import math
 import os
 from pathlib import Path
-from typing import Iterable, List, Dict, Any
+import random
+import re
+import shutil
+import time
+from typing import Iterable, List, Dict, Any, Sequence, Tuple
+import unicodedata
 
 import httpx
+import numpy as np
+
+from .ann import ANN_ENABLED, ANN_FILE, ANN_NPROBE, ANN_THRESHOLD, IVFIndex
+from .lexical import HYBRID_WEIGHT, LEXICAL_DIR, LEXICAL_PREFILTER, BM25Index, fuse_scores
+from .admission import Overloaded, embed_limiter, rerank_limiter
+from . import ollama_client
+from .cache import LRUCache
+from .embed_store import EmbeddingStore
+from .metrics import timed
 
 
-DEFAULT_OLLAMA_URL = os.getenv("OLLAMA_BASE_URL", "http://127.0.0.1:11434")
 DEFAULT_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "nomic-embed-text")
 DEFAULT_RERANK_MODEL = os.getenv("OLLAMA_RERANK_MODEL", os.getenv("OLLAMA_CHAT_MODEL", "llama3.2"))
+EMBED_CACHE_SIZE = int(os.getenv("RAG_EMBED_CACHE_SIZE", "1024"))
+EMBED_CACHE_TTL = float(os.getenv("RAG_EMBED_CACHE_TTL", "3600"))
+EMBED_BATCH_SIZE = int(os.getenv("RAG_EMBED_BATCH_SIZE", "16"))
+EMBED_CONCURRENCY = int(os.getenv("RAG_EMBED_CONCURRENCY", "4"))
+EMBED_RETRIES = int(os.getenv("RAG_EMBED_RETRIES", "3"))
+RERANK_CACHE_SIZE = int(os.getenv("RAG_RERANK_CACHE_SIZE", "4096"))
+RERANK_CACHE_TTL = float(os.getenv("RAG_RERANK_CACHE_TTL", "3600"))
+
+INDEX_FORMAT = "epitech-rag-index"
+INDEX_VERSION = 2
+INDEX_HEADER_FILE = "index.json"
+INDEX_VECTORS_FILE = "vectors.npy"
+INDEX_TEXT_FILE = "chunks.bin"
+INDEX_OFFSETS_FILE = "chunk_offsets.npy"
+INDEX_CHUNK_DOCS_FILE = "chunk_docs.npy"
+INDEX_DOCS_FILE = "docs.json"
+INDEX_PAGES_FILE = "pages.json"
+INDEX_CURRENT_FILE = "CURRENT"
+INDEX_GENERATION_RE = re.compile(r"gen-(\d+)")
+INDEX_KEEP_GENERATIONS = int(os.getenv("RAG_INDEX_KEEP_GENERATIONS", "2"))
 
 
 @dataclass
@@ -23,6 +59,213 @@ class IndexChunk:
     embedding: List[float]
 
 
+class VectorIndex:
+    """Index en memoire : une matrice float32 contigue aux lignes normalisees."""
+
+    def __init__(
+        self,
+        entries: List[Dict[str, Any]],
+        matrix: np.ndarray,
+        ann: IVFIndex | None = None,
+        lexical: BM25Index | None = None,
+    ) -> None:
+        self.entries = entries
+        self.matrix = matrix
+        self.ann = ann
+        self.lexical = lexical
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Dict[str, Any]]) -> "VectorIndex":
+        rows: List[Dict[str, Any]] = []
+        vectors: List[List[float]] = []
+        for entry in entries:
+            rows.append({key: value for key, value in entry.items() if key != "embedding"})
+            vectors.append(entry.get("embedding") or [])
+        dim = max((len(vector) for vector in vectors), default=0)
+        matrix = np.zeros((len(rows), dim), dtype=np.float32)
+        for row, vector in enumerate(vectors):
+            if len(vector) == dim:
+                matrix[row] = vector
+        for row, entry in enumerate(rows):
+            entry["id"] = row
+        return cls(rows, normalize_rows(matrix))
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[IndexChunk]) -> "VectorIndex":
+        return cls.from_entries(
+            {"url": chunk.url, "title": chunk.title, "text": chunk.text, "embedding": chunk.embedding}
+            for chunk in chunks
+        )
+
+    @property
+    def dim(self) -> int:
+        return int(self.matrix.shape[1]) if self.matrix.ndim == 2 else 0
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, row: int) -> Dict[str, Any]:
+        return self.entries[row]
+
+    def urls(self) -> List[str]:
+        if isinstance(self.entries, ChunkTable):
+            return self.entries.urls()
+        return [str(entry.get("url", "")) for entry in self.entries]
+
+    def uses_ann(self) -> bool:
+        return self.ann is not None and ANN_ENABLED and len(self.entries) >= ANN_THRESHOLD
+
+    def search(
+        self,
+        query_embedding: Sequence[float],
+        top_k: int = 4,
+        rows: Sequence[int] | None = None,
+        query_text: str | None = None,
+    ) -> List[Dict[str, Any]]:
+        if top_k <= 0 or not len(self.entries):
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.ndim != 1 or query.shape[0] != self.dim:
+            return []
+        norm = float(np.linalg.norm(query))
+        if norm == 0.0:
+            return []
+        query = query / norm
+        prefilter = rows is None and 0 < LEXICAL_PREFILTER < len(self.entries)
+        terms: List[int] = []
+        lexical = None
+        if query_text and self.lexical is not None and (prefilter or HYBRID_WEIGHT > 0.0):
+            terms = self.lexical.query_terms(query_text)
+        if terms:
+            # un seul calcul BM25 par requete, partage par le pre-filtre et la fusion
+            lexical = self.lexical.scores(terms)
+        if lexical is not None and prefilter:
+            # pre-filtre lexical (opt-in) : ajoute aux candidats IVF, ne les remplace pas
+            matched = self.lexical.top_rows(terms, LEXICAL_PREFILTER, scores=lexical)
+            if matched.size >= top_k:
+                rows = matched
+                if self.uses_ann():
+                    rows = np.union1d(matched, self.ann.probe(query, ANN_NPROBE))
+        if rows is None and self.uses_ann():
+            rows = self.ann.probe(query, ANN_NPROBE)
+        if rows is None:
+            row_ids = None
+            scores = self.matrix @ query
+        else:
+            row_ids = np.asarray(rows, dtype=np.int64)
+            if not row_ids.size:
+                return []
+            scores = self.matrix[row_ids] @ query
+        ranking = scores
+        if lexical is not None and HYBRID_WEIGHT > 0.0:
+            # le score fusionne sert seulement a l'ordre : "score" reste le cosinus (seuils, rerank local)
+            ranking = fuse_scores(scores, lexical if row_ids is None else lexical[row_ids], HYBRID_WEIGHT)
+        winners = top_k_indices(ranking, top_k)
+        if row_ids is not None:
+            winners_rows = row_ids[winners]
+        else:
+            winners_rows = winners
+        results = []
+        for pos, row in zip(winners, winners_rows):
+            hit = {**self.entries[int(row)], "score": float(scores[pos])}
+            if ranking is not scores:
+                hit["hybrid_score"] = float(ranking[pos])
+            results.append(hit)
+        return results
+
+
+class ChunkTable:
+    """
+    Metadonnees des chunks lues en memory-map (textes UTF-8 concatenes + offsets) : les workers
+    uvicorn partagent les pages du cache disque au lieu de garder chacun une copie des textes.
+    """
+
+    def __init__(
+        self,
+        docs: List[Tuple[str, str]],
+        chunk_docs: np.ndarray,
+        offsets: np.ndarray,
+        blob: np.ndarray,
+    ) -> None:
+        self.docs = docs  # (url, title) par page, partages par ses chunks
+        self.chunk_docs = chunk_docs
+        self.offsets = offsets
+        self.blob = blob
+
+    @classmethod
+    def load(cls, path: Path) -> "ChunkTable":
+        docs = [(url, title) for url, title in json.loads((path / INDEX_DOCS_FILE).read_text(encoding="utf-8"))]
+        chunk_docs = np.load(path / INDEX_CHUNK_DOCS_FILE, mmap_mode="r")
+        offsets = np.load(path / INDEX_OFFSETS_FILE, mmap_mode="r")
+        text_path = path / INDEX_TEXT_FILE
+        # mmap refuse les fichiers vides
+        if text_path.stat().st_size:
+            blob = np.memmap(text_path, dtype=np.uint8, mode="r")
+        else:
+            blob = np.zeros(0, dtype=np.uint8)
+        return cls(docs, chunk_docs, offsets, blob)
+
+    @staticmethod
+    def save(entries: Iterable[Dict[str, Any]], path: Path) -> int:
+        docs: Dict[Tuple[str, str], int] = {}
+        chunk_docs: List[int] = []
+        offsets = [0]
+        with (path / INDEX_TEXT_FILE).open("wb") as handle:
+            for entry in entries:
+                key = (str(entry.get("url", "")), str(entry.get("title", "")))
+                chunk_docs.append(docs.setdefault(key, len(docs)))
+                data = str(entry.get("text", "")).encode("utf-8")
+                handle.write(data)
+                offsets.append(offsets[-1] + len(data))
+        np.save(path / INDEX_CHUNK_DOCS_FILE, np.asarray(chunk_docs, dtype=np.int32))
+        np.save(path / INDEX_OFFSETS_FILE, np.asarray(offsets, dtype=np.int64))
+        payload = json.dumps([list(key) for key in docs], ensure_ascii=False)
+        (path / INDEX_DOCS_FILE).write_text(payload, encoding="utf-8")
+        return len(chunk_docs)
+
+    def __len__(self) -> int:
+        return int(self.chunk_docs.shape[0])
+
+    def __getitem__(self, row: int) -> Dict[str, Any]:
+        if row < 0:
+            row += len(self)
+        if not 0 <= row < len(self):
+            raise IndexError(row)
+        url, title = self.docs[int(self.chunk_docs[row])]
+        start, end = int(self.offsets[row]), int(self.offsets[row + 1])
+        text = bytes(self.blob[start:end]).decode("utf-8")
+        return {"url": url, "title": title, "text": text, "id": row}
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self[row]
+
+    def urls(self) -> List[str]:
+        return [self.docs[doc][0] for doc in self.chunk_docs.tolist()]
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    if not matrix.size:
+        return matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0.0] = 1.0
+    return matrix / norms
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    if top_k < scores.shape[0]:
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(scores.shape[0])
+    # tri stable : score decroissant puis ordre d'origine
+    order = np.lexsort((candidates, -scores[candidates]))
+    return candidates[order]
+
+
 def normalize_text(text: str) -> str:
     return " ".join(text.split())
 
@@ -36,24 +279,111 @@ def chunk_text(text: str, chunk_size: int = 1200, overlap: int = 200) -> Iterabl
 
 
 def embed_text(text: str, model: str = DEFAULT_EMBED_MODEL) -> List[float]:
-    resp = httpx.post(
-        f"{DEFAULT_OLLAMA_URL}/api/embeddings",
-        json={"model": model, "prompt": text},
-        timeout=60,
-    )
-    resp.raise_for_status()
-    data = resp.json()
-    return data.get("embedding", [])
+    return ollama_client.embed(text, model)
 
 
-def build_index(
+# (modele, question normalisee) -> embedding de la requete
+query_embedding_cache = LRUCache(maxsize=EMBED_CACHE_SIZE, ttl=EMBED_CACHE_TTL)
+# (question normalisee, empreinte du chunk, modele) -> score du reranker
+rerank_score_cache = LRUCache(maxsize=RERANK_CACHE_SIZE, ttl=RERANK_CACHE_TTL)
+
+
+def normalize_query(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    stripped = re.sub(r"[^\w\s]", " ", stripped)
+    return " ".join(stripped.split())
+
+
+def embed_query(text: str, model: str = DEFAULT_EMBED_MODEL) -> List[float]:
+    key = (model, normalize_query(text))
+    cached = query_embedding_cache.get(key)
+    if cached is not None:
+        return cached
+    embedding = embed_text(text, model=model)
+    if embedding:
+        query_embedding_cache.set(key, embedding)
+    return embedding
+
+
+async def embed_text_async(text: str, model: str = DEFAULT_EMBED_MODEL) -> List[float]:
+    return await ollama_client.embed_async(text, model)
+
+
+async def embed_query_async(text: str, model: str = DEFAULT_EMBED_MODEL) -> List[float]:
+    key = (model, normalize_query(text))
+    cached = query_embedding_cache.get(key)
+    if cached is not None:
+        return cached
+    async with embed_limiter.slot():
+        embedding = await embed_text_async(text, model=model)
+    if embedding:
+        query_embedding_cache.set(key, embedding)
+    return embedding
+
+
+def embed_batch_with_retry(
+    texts: List[str],
+    model: str = DEFAULT_EMBED_MODEL,
+    retries: int = EMBED_RETRIES,
+    backoff_s: float = 1.0,
+) -> List[List[float]]:
+    for attempt in range(retries + 1):
+        try:
+            return ollama_client.embed_batch(texts, model)
+        except httpx.HTTPError:
+            if attempt == retries:
+                raise
+            time.sleep(backoff_s * (2**attempt) * (1 + random.random()))
+    return []
+
+
+def embed_batches(
+    texts: List[str],
+    model: str = DEFAULT_EMBED_MODEL,
+    batch_size: int = EMBED_BATCH_SIZE,
+    concurrency: int = EMBED_CONCURRENCY,
+    retries: int = EMBED_RETRIES,
+) -> List[List[float]]:
+    batch_size = max(1, batch_size)
+    batches = [texts[i : i + batch_size] for i in range(0, len(texts), batch_size)]
+    embeddings: List[List[float]] = []
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        # map conserve l'ordre des batches
+        for result in pool.map(lambda batch: embed_batch_with_retry(batch, model, retries), batches):
+            embeddings.extend(result)
+    return embeddings
+
+
+def embed_texts(
+    texts: List[str],
+    model: str = DEFAULT_EMBED_MODEL,
+    batch_size: int = EMBED_BATCH_SIZE,
+    concurrency: int = EMBED_CONCURRENCY,
+    retries: int = EMBED_RETRIES,
+    store: EmbeddingStore | None = None,
+) -> List[List[float]]:
+    # un texte repete (menus, pieds de page) n'est embedde qu'une fois
+    unique = list(dict.fromkeys(texts))
+    known = store.get_many(model, unique) if store is not None else {}
+    missing = [text for text in unique if text not in known]
+    if missing:
+        vectors = embed_batches(
+            missing, model=model, batch_size=batch_size, concurrency=concurrency, retries=retries
+        )
+        fresh = dict(zip(missing, vectors))
+        if store is not None:
+            store.put_many(model, fresh.items())
+        known.update(fresh)
+    return [known.get(text, []) for text in texts]
+
+
+def iter_page_chunks(
     pages: Iterable[Dict[str, str]],
     chunk_size: int = 1200,
     overlap: int = 200,
     max_chunks_per_page: int = 8,
-    embed_model: str = DEFAULT_EMBED_MODEL,
-) -> List[IndexChunk]:
-    chunks: List[IndexChunk] = []
+) -> Iterable[Tuple[str, str, str]]:
     for page in pages:
         url = page.get("url", "")
         title = page.get("title", "")
@@ -61,16 +391,70 @@ def build_index(
         if not text:
             continue
         for chunk in chunk_text(text, chunk_size=chunk_size, overlap=overlap)[:max_chunks_per_page]:
-            embedding = embed_text(chunk, model=embed_model)
-            if not embedding:
-                continue
-            chunks.append(IndexChunk(url=url, title=title, text=chunk, embedding=embedding))
+            yield url, title, chunk
+
+
+def build_index(
+    pages: Iterable[Dict[str, str]],
+    chunk_size: int = 1200,
+    overlap: int = 200,
+    max_chunks_per_page: int = 8,
+    embed_model: str = DEFAULT_EMBED_MODEL,
+    batch_size: int = EMBED_BATCH_SIZE,
+    concurrency: int = EMBED_CONCURRENCY,
+    retries: int = EMBED_RETRIES,
+    store: EmbeddingStore | None = None,
+) -> List[IndexChunk]:
+    pending = list(iter_page_chunks(pages, chunk_size, overlap, max_chunks_per_page))
+    embeddings = embed_texts(
+        [text for _, _, text in pending],
+        model=embed_model,
+        batch_size=batch_size,
+        concurrency=concurrency,
+        retries=retries,
+        store=store,
+    )
+    chunks: List[IndexChunk] = []
+    for (url, title, text), embedding in zip(pending, embeddings):
+        if not embedding:
+            continue
+        chunks.append(IndexChunk(url=url, title=title, text=text, embedding=embedding))
     return chunks
 
 
-def save_index(chunks: Iterable[IndexChunk], path: Path) -> None:
+def is_jsonl_path(path: Path) -> bool:
+    return path.suffix == ".jsonl"
+
+
+def save_index(
+    chunks: Iterable[IndexChunk] | VectorIndex,
+    path: Path,
+    embed_model: str = DEFAULT_EMBED_MODEL,
+    manifest: Dict[str, Dict[str, str]] | None = None,
+) -> None:
+    if is_jsonl_path(path):
+        save_index_jsonl(chunks, path)
+        return
+    if not isinstance(chunks, VectorIndex):
+        chunks = VectorIndex.from_chunks(chunks)
+    publish_index(chunks, path, embed_model=embed_model, manifest=manifest)
+
+
+def save_index_jsonl(chunks: Iterable[IndexChunk] | VectorIndex, path: Path) -> None:
     path.parent.mkdir(parents=True, exist_ok=True)
-    with path.open("w", encoding="utf-8") as handle:
+    if isinstance(chunks, VectorIndex):
+        chunks = [
+            IndexChunk(
+                url=entry.get("url", ""),
+                title=entry.get("title", ""),
+                text=entry.get("text", ""),
+                embedding=chunks.matrix[row].tolist(),
+            )
+            for row, entry in enumerate(chunks.entries)
+        ]
+    # fichier temporaire puis os.replace : un lecteur ne voit jamais un JSONL a moitie ecrit
+    tmp_path = path.with_name(path.name + ".tmp")
+    with tmp_path.open("w", encoding="utf-8") as handle:
         for chunk in chunks:
             payload = {
                 "url": chunk.url,
@@ -79,10 +463,136 @@ def save_index(chunks: Iterable[IndexChunk], path: Path) -> None:
                 "embedding": chunk.embedding,
             }
             handle.write(json.dumps(payload, ensure_ascii=True) + "\n")
+    os.replace(tmp_path, path)
+
+
+def save_index_binary(index: VectorIndex, path: Path, embed_model: str = DEFAULT_EMBED_MODEL) -> None:
+    path.mkdir(parents=True, exist_ok=True)
+    np.save(path / INDEX_VECTORS_FILE, np.ascontiguousarray(index.matrix, dtype=np.float32))
+    ChunkTable.save(index.entries, path)
+    ann_path = path / ANN_FILE
+    if index.ann is not None:
+        index.ann.save(path)
+    elif ann_path.exists():
+        ann_path.unlink()
+    lexical_path = path / LEXICAL_DIR
+    if index.lexical is not None:
+        index.lexical.save(path)
+    elif lexical_path.exists():
+        shutil.rmtree(lexical_path)
+    # l'en-tete est ecrit en dernier : sa presence signale un index complet
+    header = {
+        "format": INDEX_FORMAT,
+        "version": INDEX_VERSION,
+        "count": len(index),
+        "dim": index.dim,
+        "dtype": "float32",
+        "normalized": True,
+        "embed_model": embed_model,
+    }
+    (path / INDEX_HEADER_FILE).write_text(json.dumps(header, indent=2) + "\n", encoding="utf-8")
+
+
+def list_generations(path: Path) -> List[Path]:
+    if not path.is_dir():
+        return []
+    found = [child for child in path.iterdir() if child.is_dir() and INDEX_GENERATION_RE.fullmatch(child.name)]
+    return sorted(found, key=lambda child: int(child.name[4:]))
+
 
+def resolve_index_dir(path: Path) -> Path:
+    """Generation pointee par CURRENT, ou le chemin lui-meme (fichier JSONL, dossier sans generation)."""
+    pointer = path / INDEX_CURRENT_FILE
+    if pointer.is_file():
+        current = path / pointer.read_text(encoding="utf-8").strip()
+        if not current.is_dir():
+            raise FileNotFoundError(f"{pointer} points to a missing generation ({current.name})")
+        return current
+    return path
 
-def load_index(path: Path) -> List[Dict[str, Any]]:
-    if not path.exists():
+
+def publish_index(
+    index: VectorIndex,
+    path: Path,
+    embed_model: str = DEFAULT_EMBED_MODEL,
+    manifest: Dict[str, Dict[str, str]] | None = None,
+) -> Path:
+    """
+    Ecrit une nouvelle generation (path/gen-NNNNNN) puis bascule CURRENT par os.replace :
+    un worker charge l'ancienne generation ou la nouvelle, jamais un melange des deux.
+    """
+    tmp_path = start_generation(path)
+    save_index_binary(index, tmp_path, embed_model=embed_model)
+    if manifest is not None:
+        save_page_manifest(tmp_path, manifest)
+    return switch_generation(path, tmp_path)
+
+
+def publish_manifest(path: Path, manifest: Dict[str, Dict[str, str]]) -> Path:
+    """
+    Nouvelle generation dont seul pages.json change (re-indexation sans modification) : les autres
+    fichiers, immuables, sont des liens durs vers la generation courante au lieu d'une copie.
+    """
+    current = resolve_index_dir(path)
+    if current == path:
+        raise FileNotFoundError(f"No published index generation in {path}")
+    tmp_path = start_generation(path)
+    shutil.copytree(current, tmp_path, copy_function=link_or_copy, ignore=shutil.ignore_patterns(INDEX_PAGES_FILE))
+    save_page_manifest(tmp_path, manifest)
+    return switch_generation(path, tmp_path)
+
+
+def link_or_copy(source: str, target: str) -> None:
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copy2(source, target)
+
+
+def start_generation(path: Path) -> Path:
+    path.mkdir(parents=True, exist_ok=True)
+    generations = list_generations(path)
+    number = int(generations[-1].name[4:]) + 1 if generations else 1
+    tmp_path = path / f"gen-{number:06d}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    return tmp_path
+
+
+def switch_generation(path: Path, tmp_path: Path) -> Path:
+    generation = tmp_path.with_suffix("")
+    os.replace(tmp_path, generation)
+    pointer_tmp = path / (INDEX_CURRENT_FILE + ".tmp")
+    pointer_tmp.write_text(generation.name + "\n", encoding="utf-8")
+    os.replace(pointer_tmp, path / INDEX_CURRENT_FILE)
+    prune_generations(path)
+    return generation
+
+
+def prune_generations(path: Path, keep: int = INDEX_KEEP_GENERATIONS) -> None:
+    # les workers qui mappent encore une ancienne generation gardent leurs pages apres l'unlink
+    current = resolve_index_dir(path)
+    for generation in list_generations(path)[: -max(1, keep)]:
+        if generation != current:
+            shutil.rmtree(generation, ignore_errors=True)
+
+
+def load_index(path: Path) -> VectorIndex:
+    path = resolve_index_dir(path)
+    if (path / INDEX_HEADER_FILE).exists():
+        return load_index_binary(path)
+    index = VectorIndex.from_entries(load_index_jsonl(path))
+    # l'ancien format ne stocke pas le BM25 : reconstruit au chargement (petits index)
+    if len(index):
+        index.lexical = build_lexical(index)
+    return index
+
+
+def build_lexical(index: VectorIndex) -> BM25Index:
+    return BM25Index.build(str(entry.get("text", "")) for entry in index)
+
+
+def load_index_jsonl(path: Path) -> List[Dict[str, Any]]:
+    if not path.is_file():
         return []
     entries: List[Dict[str, Any]] = []
     with path.open("r", encoding="utf-8") as handle:
@@ -94,6 +604,71 @@ def load_index(path: Path) -> List[Dict[str, Any]]:
     return entries
 
 
+def read_index_header(path: Path) -> Dict[str, Any]:
+    header = json.loads((path / INDEX_HEADER_FILE).read_text(encoding="utf-8"))
+    if header.get("format") != INDEX_FORMAT:
+        raise ValueError(f"{path} is not a {INDEX_FORMAT} directory")
+    if header.get("version") != INDEX_VERSION:
+        raise ValueError(f"Unsupported index version {header.get('version')} in {path}")
+    return header
+
+
+def load_index_binary(path: Path) -> VectorIndex:
+    header = read_index_header(path)
+    matrix = np.load(path / INDEX_VECTORS_FILE, mmap_mode="r")
+    entries = ChunkTable.load(path)
+    if len(entries) != header["count"] or matrix.shape[0] != header["count"]:
+        raise ValueError(f"Index {path} is incomplete ({len(entries)} entries, {matrix.shape[0]} vectors)")
+    if not header.get("normalized", False):
+        matrix = normalize_rows(matrix)
+    lexical = BM25Index.load(path)
+    if lexical is not None and len(lexical) != len(entries):
+        lexical = None
+    return VectorIndex(entries, matrix, ann=IVFIndex.load(path), lexical=lexical)
+
+
+def merge_index(base: VectorIndex, keep_rows: Sequence[int], added: VectorIndex) -> VectorIndex:
+    entries = [dict(base[row]) for row in keep_rows] + [dict(entry) for entry in added.entries]
+    parts = []
+    if len(keep_rows):
+        parts.append(np.asarray(base.matrix[np.asarray(keep_rows, dtype=np.int64)], dtype=np.float32))
+    if len(added):
+        parts.append(np.asarray(added.matrix, dtype=np.float32))
+    if len({part.shape[1] for part in parts}) > 1:
+        raise ValueError("Cannot merge indexes built with different embedding sizes")
+    matrix = np.vstack(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+    for row, entry in enumerate(entries):
+        entry["id"] = row
+    return VectorIndex(entries, np.ascontiguousarray(matrix))
+
+
+def load_page_manifest(path: Path) -> Dict[str, Dict[str, str]]:
+    manifest_path = resolve_index_dir(path) / INDEX_PAGES_FILE
+    if not manifest_path.exists():
+        return {}
+    return json.loads(manifest_path.read_text(encoding="utf-8"))
+
+
+def save_page_manifest(path: Path, manifest: Dict[str, Dict[str, str]]) -> None:
+    # uniquement dans une generation en cours d'ecriture : une generation publiee ne change plus
+    path.mkdir(parents=True, exist_ok=True)
+    payload = json.dumps(manifest, ensure_ascii=False, indent=1, sort_keys=True)
+    tmp_path = path / (INDEX_PAGES_FILE + ".tmp")
+    tmp_path.write_text(payload + "\n", encoding="utf-8")
+    os.replace(tmp_path, path / INDEX_PAGES_FILE)
+
+
+def index_mtime(path: Path) -> float:
+    # CURRENT n'est remplace qu'une fois la nouvelle generation complete
+    pointer = path / INDEX_CURRENT_FILE
+    if pointer.exists():
+        return pointer.stat().st_mtime
+    header_path = path / INDEX_HEADER_FILE
+    if header_path.exists():
+        return header_path.stat().st_mtime
+    return path.stat().st_mtime
+
+
 def cosine_similarity(vec_a: List[float], vec_b: List[float]) -> float:
     if not vec_a or not vec_b or len(vec_a) != len(vec_b):
         return 0.0
@@ -106,23 +681,49 @@ def cosine_similarity(vec_a: List[float], vec_b: List[float]) -> float:
 
 
 def search_index(
-    index: List[Dict[str, Any]],
+    index: VectorIndex | List[Dict[str, Any]],
     query: str,
     top_k: int = 4,
     embed_model: str = DEFAULT_EMBED_MODEL,
+    rows: Sequence[int] | None = None,
 ) -> List[Dict[str, Any]]:
+    engine = index if isinstance(index, VectorIndex) else VectorIndex.from_entries(index)
+    if not len(engine):
+        return []
     try:
-        query_embedding = embed_text(query, model=embed_model)
+        with timed("embed"):
+            query_embedding = embed_query(query, model=embed_model)
     except httpx.HTTPError:
         return []
     if not query_embedding:
         return []
-    scored: List[Dict[str, Any]] = []
-    for entry in index:
-        score = cosine_similarity(query_embedding, entry.get("embedding", []))
-        scored.append({**entry, "score": score})
-    scored.sort(key=lambda item: item["score"], reverse=True)
-    return scored[:top_k]
+    with timed("search"):
+        return engine.search(query_embedding, top_k=top_k, rows=rows, query_text=query)
+
+
+async def search_index_async(
+    index: VectorIndex | List[Dict[str, Any]],
+    query: str,
+    top_k: int = 4,
+    embed_model: str = DEFAULT_EMBED_MODEL,
+    rows: Sequence[int] | None = None,
+) -> List[Dict[str, Any]]:
+    if isinstance(index, VectorIndex):
+        engine = index
+    else:
+        engine = await asyncio.to_thread(VectorIndex.from_entries, index)
+    if not len(engine):
+        return []
+    try:
+        with timed("embed"):
+            query_embedding = await embed_query_async(query, model=embed_model)
+    except httpx.HTTPError:
+        return []
+    if not query_embedding:
+        return []
+    # le scoring NumPy tourne dans le pool de threads pour liberer l'event loop
+    with timed("search"):
+        return await asyncio.to_thread(engine.search, query_embedding, top_k, rows, query)
 
 
 def rerank_results(
@@ -133,23 +734,76 @@ def rerank_results(
 ) -> List[Dict[str, Any]]:
     if not candidates:
         return []
-    prompt = build_rerank_prompt(query, candidates)
-    try:
-        resp = httpx.post(
-            f"{DEFAULT_OLLAMA_URL}/api/generate",
-            json={"model": model, "prompt": prompt, "stream": False},
-            timeout=60,
-        )
-        resp.raise_for_status()
-        data = resp.json()
-        raw = data.get("response", "").strip()
-    except (httpx.HTTPError, ValueError):
-        return candidates[:top_k]
+    keys, scores = cached_rerank_scores(query, candidates, model)
+    missing = [pos for pos, score in enumerate(scores) if score is None]
+    if missing:
+        prompt = build_rerank_prompt(query, [candidates[pos] for pos in missing])
+        try:
+            raw = ollama_client.generate(prompt, model, timeout=ollama_client.RERANK_TIMEOUT, operation="rerank")
+        except (httpx.HTTPError, ValueError):
+            return candidates[:top_k]
+        if not fill_rerank_scores(keys, scores, missing, raw):
+            return candidates[:top_k]
+    return rank_by_scores(candidates, scores, top_k)
+
+
+async def rerank_results_async(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    top_k: int = 4,
+    model: str = DEFAULT_RERANK_MODEL,
+) -> List[Dict[str, Any]]:
+    if not candidates:
+        return []
+    keys, scores = cached_rerank_scores(query, candidates, model)
+    missing = [pos for pos, score in enumerate(scores) if score is None]
+    if missing:
+        prompt = build_rerank_prompt(query, [candidates[pos] for pos in missing])
+        try:
+            async with rerank_limiter.slot():
+                raw = await ollama_client.generate_async(
+                    prompt, model, timeout=ollama_client.RERANK_TIMEOUT, operation="rerank"
+                )
+        except (httpx.HTTPError, ValueError, Overloaded):
+            # rerank sature : l'ordre de la recherche suffit, pas la peine de refuser la requete
+            return candidates[:top_k]
+        if not fill_rerank_scores(keys, scores, missing, raw):
+            return candidates[:top_k]
+    return rank_by_scores(candidates, scores, top_k)
+
+
+def chunk_fingerprint(entry: Dict[str, Any]) -> str:
+    # les ids de ligne changent a chaque reconstruction de l'index, pas le contenu
+    payload = f"{entry.get('url', '')}\0{entry.get('text', '')}".encode("utf-8")
+    return hashlib.blake2b(payload, digest_size=12).hexdigest()
 
-    scores = parse_score_list(raw, expected_len=len(candidates))
-    if scores is None:
-        return candidates[:top_k]
 
+def cached_rerank_scores(
+    query: str,
+    candidates: List[Dict[str, Any]],
+    model: str,
+) -> Tuple[List[Tuple[str, str, str]], List[int | None]]:
+    normalized = normalize_query(query)
+    keys = [(normalized, chunk_fingerprint(entry), model) for entry in candidates]
+    return keys, [rerank_score_cache.get(key) for key in keys]
+
+
+def fill_rerank_scores(
+    keys: List[Tuple[str, str, str]],
+    scores: List[int | None],
+    missing: List[int],
+    raw: str,
+) -> bool:
+    fresh = parse_score_list(raw, expected_len=len(missing))
+    if fresh is None:
+        return False
+    for pos, score in zip(missing, fresh):
+        scores[pos] = score
+        rerank_score_cache.set(keys[pos], score)
+    return True
+
+
+def rank_by_scores(candidates: List[Dict[str, Any]], scores: Sequence[int], top_k: int) -> List[Dict[str, Any]]:
     rescored = []
     for entry, score in zip(candidates, scores):
         rescored.append({**entry, "rerank_score": score})
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+import logging
+import os
+from pathlib import Path
+import threading
+import time
+from typing import Any, Callable
+
+from .rag import VectorIndex, index_mtime, is_jsonl_path, load_index
+
+
+INDEX_RELOAD_INTERVAL = float(os.getenv("RAG_INDEX_RELOAD_INTERVAL", "2"))
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class IndexSnapshot:
+    """Index + structures derivees d'une meme version, publies ensemble."""
+
+    index: VectorIndex
+    derived: Any
+    generation: int  # incremente a chaque rechargement reussi
+    mtime: float
+
+
+class IndexReloader:
+    """
+    Surveille l'index publie et le recharge dans un thread de fond : les requetes lisent
+    le dernier snapshot sans stat ni parsing, et le remplacement est une simple affectation.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        derive: Callable[[VectorIndex], Any],
+        interval: float = INDEX_RELOAD_INTERVAL,
+    ) -> None:
+        self.path = path
+        self.derive = derive
+        self.interval = interval
+        self.snapshot: IndexSnapshot | None = None
+        self._failed_mtime: float | None = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def current(self) -> IndexSnapshot:
+        snapshot = self.snapshot
+        if snapshot is None:
+            # premier acces sans start() (scripts) : chargement synchrone, une seule fois
+            self.reload()
+            snapshot = self.snapshot
+        return snapshot
+
+    def reload(self) -> bool:
+        with self._lock:
+            previous = self.snapshot
+            mtime = None
+            try:
+                mtime = index_mtime(self.path) if self.path.exists() else 0.0
+                if previous is not None and mtime in (previous.mtime, self._failed_mtime):
+                    return False
+                started = time.perf_counter()
+                index = load_index(self.path) if mtime else VectorIndex.from_entries([])
+                derived = self.derive(index)
+            except Exception as exc:
+                # index illisible : on garde la version servie, nouvel essai a la prochaine publication
+                self._failed_mtime = mtime
+                logger.error("Index reload from %s failed: %s", self.path, exc)
+                if previous is None:
+                    index = VectorIndex.from_entries([])
+                    self.snapshot = IndexSnapshot(index, self.derive(index), 0, -1.0)
+                return False
+            if previous is None and not mtime:
+                logger.warning(
+                    "No index at %s: build it with `python -m backend.app.indexer --output %s`.", self.path, self.path
+                )
+            elif previous is None and is_jsonl_path(self.path):
+                logger.warning(
+                    "Serving the JSONL index %s; rebuild it with `python -m backend.app.indexer --output rag_index`.",
+                    self.path,
+                )
+            generation = previous.generation + 1 if previous is not None else 1
+            self.snapshot = IndexSnapshot(index, derived, generation, mtime)
+            if previous is not None:
+                elapsed = time.perf_counter() - started
+                logger.info(
+                    "Index reloaded from %s: %d chunks in %.2fs (generation %d).", self.path, len(index), elapsed, generation
+                )
+            return True
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.reload()
+
+    def start(self) -> None:
+        if self._thread is not None or self.interval <= 0:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="index-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
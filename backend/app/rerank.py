@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import Any, Dict, List
+from urllib.parse import urlparse
+
+from .lexical import tokenize
+from .metrics import timed
+from .rag import DEFAULT_RERANK_MODEL, rerank_results_async
+
+
+RERANK_BUDGET = float(os.getenv("RAG_RERANK_BUDGET", "8"))
+LOCAL_LEXICAL_WEIGHT = 0.5
+LOCAL_TITLE_WEIGHT = 0.3
+
+# mots trop frequents pour departager deux passages
+STOPWORDS = frozenset(
+    "a au aux avec c ce ces comment d dans de des du en est et il je l la le les leur ma mes mon ne "
+    "ou par pas pour qu que quel quelle quelles quels qui sa se ses son sont sur ta tu un une vos "
+    "votre vous y the of and to in is what how".split()
+)
+
+
+def parse_rerank_mode(value: str) -> str:
+    value = value.strip().lower()
+    if value in ("0", "off", "false", "no", "none", ""):
+        return "off"
+    if value == "local":
+        return "local"
+    # "1" reste l'ancien comportement : rerank par le LLM
+    return "llm"
+
+
+RERANK_MODE = parse_rerank_mode(os.getenv("RAG_RERANK", "llm"))
+
+
+class Reranker:
+    """Strategie de rerank : recoit les candidats de la recherche, rend les top_k."""
+
+    name = "off"
+
+    async def rerank(self, query: str, candidates: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        return candidates[:top_k]
+
+
+class LLMReranker(Reranker):
+    name = "llm"
+
+    def __init__(self, model: str = DEFAULT_RERANK_MODEL) -> None:
+        self.model = model
+
+    async def rerank(self, query: str, candidates: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        return await rerank_results_async(query, candidates, top_k=top_k, model=self.model)
+
+
+class LocalReranker(Reranker):
+    """
+    Rerank en process : score dense + couverture des mots de la question dans le texte,
+    puis dans le titre et l'URL (noms de programmes). Quelques millisecondes, sans LLM.
+    """
+
+    name = "local"
+
+    def __init__(self, lexical_weight: float = LOCAL_LEXICAL_WEIGHT, title_weight: float = LOCAL_TITLE_WEIGHT) -> None:
+        self.lexical_weight = lexical_weight
+        self.title_weight = title_weight
+
+    def score(self, terms: List[str], entry: Dict[str, Any]) -> float:
+        dense = float(entry.get("score", 0.0))
+        if not terms:
+            return dense
+        text_tokens = set(tokenize(str(entry.get("text", ""))))
+        url = str(entry.get("url", ""))
+        title_tokens = set(tokenize(str(entry.get("title", "")) + " " + urlparse(url).path))
+        coverage = sum(1 for term in terms if term in text_tokens) / len(terms)
+        title_coverage = sum(1 for term in terms if term in title_tokens) / len(terms)
+        return dense + self.lexical_weight * coverage + self.title_weight * title_coverage
+
+    async def rerank(self, query: str, candidates: List[Dict[str, Any]], top_k: int) -> List[Dict[str, Any]]:
+        terms = [term for term in dict.fromkeys(tokenize(query)) if term not in STOPWORDS]
+        rescored = [{**entry, "local_score": self.score(terms, entry)} for entry in candidates]
+        # pas de "rerank_score" : le seuil sur le score dense de build_sources reste applique
+        rescored.sort(key=lambda item: item["local_score"], reverse=True)
+        return rescored[:top_k]
+
+
+def get_reranker(mode: str = RERANK_MODE) -> Reranker:
+    if mode == "llm":
+        return LLMReranker()
+    if mode == "local":
+        return LocalReranker()
+    return Reranker()
+
+
+async def rerank_within_budget(
+    reranker: Reranker,
+    query: str,
+    candidates: List[Dict[str, Any]],
+    top_k: int,
+    budget: float = RERANK_BUDGET,
+) -> List[Dict[str, Any]]:
+    """Au-dela de `budget` secondes, le rerank est abandonne et l'ordre de la recherche garde."""
+    if not candidates:
+        return []
+    with timed("rerank"):
+        if budget <= 0:
+            return await reranker.rerank(query, candidates, top_k)
+        try:
+            return await asyncio.wait_for(reranker.rerank(query, candidates, top_k), timeout=budget)
+        except asyncio.TimeoutError:
+            return candidates[:top_k]
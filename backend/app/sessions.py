@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+import asyncio
+from collections import OrderedDict
+import json
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+from typing import List, Tuple
+
+
+SESSION_BACKEND = os.getenv("RAG_SESSION_BACKEND", "memory")
+SESSION_PATH = os.getenv("RAG_SESSION_PATH", "rag_sessions.sqlite")
+SESSION_MAX = int(os.getenv("RAG_SESSION_MAX", "10000"))
+SESSION_TTL = float(os.getenv("RAG_SESSION_TTL", "86400"))
+SESSION_MAX_BYTES = int(os.getenv("RAG_SESSION_MAX_BYTES", str(64 * 1024 * 1024)))
+
+History = List[Tuple[str, str]]
+
+
+def history_size(history: History) -> int:
+    # estimation grossiere : texte + surcout des tuples
+    return sum(len(role) + len(content) + 64 for role, content in history) + 128
+
+
+class SessionStore(ABC):
+    """Historique des conversations par session_id, borne et avec expiration."""
+
+    @abstractmethod
+    def get(self, session_id: str) -> History:
+        ...
+
+    @abstractmethod
+    def set(self, session_id: str, history: History) -> None:
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str) -> None:
+        ...
+
+    @abstractmethod
+    def __len__(self) -> int:
+        ...
+
+    async def get_async(self, session_id: str) -> History:
+        # acces bloquant (fichier, verrou SQLite) hors de l'event loop
+        return await asyncio.to_thread(self.get, session_id)
+
+    async def set_async(self, session_id: str, history: History) -> None:
+        await asyncio.to_thread(self.set, session_id, history)
+
+    def close(self) -> None:
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """Sessions en memoire du processus : LRU + TTL + plafond en octets."""
+
+    def __init__(
+        self,
+        max_sessions: int = SESSION_MAX,
+        ttl: float = SESSION_TTL,
+        max_bytes: int = SESSION_MAX_BYTES,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._data: OrderedDict[str, Tuple[float, int, History]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> History:
+        with self._lock:
+            item = self._data.get(session_id)
+            if item is None:
+                return []
+            updated, size, history = item
+            if self.ttl > 0 and time.monotonic() - updated > self.ttl:
+                self._drop(session_id)
+                return []
+            self._data.move_to_end(session_id)
+            return list(history)
+
+    def set(self, session_id: str, history: History) -> None:
+        size = history_size(history)
+        with self._lock:
+            if session_id in self._data:
+                self._drop(session_id)
+            self._data[session_id] = (time.monotonic(), size, list(history))
+            self.bytes += size
+            while self._data and (len(self._data) > self.max_sessions or self.bytes > self.max_bytes):
+                self._drop(next(iter(self._data)))
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            if session_id in self._data:
+                self._drop(session_id)
+
+    def _drop(self, session_id: str) -> None:
+        _, size, _ = self._data.pop(session_id)
+        self.bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    # dictionnaire en memoire : pas besoin d'un thread
+    async def get_async(self, session_id: str) -> History:
+        return self.get(session_id)
+
+    async def set_async(self, session_id: str, history: History) -> None:
+        self.set(session_id, history)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions dans un fichier SQLite partage entre les workers uvicorn."""
+
+    def __init__(
+        self,
+        path: Path | str = SESSION_PATH,
+        max_sessions: int = SESSION_MAX,
+        ttl: float = SESSION_TTL,
+        cleanup_every: int = 100,
+    ) -> None:
+        self.path = Path(path)
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.cleanup_every = cleanup_every
+        self._writes = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._conn:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY,"
+                " history TEXT NOT NULL,"
+                " updated REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated)")
+
+    def get(self, session_id: str) -> History:
+        # horloge murale : partagee par tous les processus
+        oldest = time.time() - self.ttl if self.ttl > 0 else 0.0
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT history FROM sessions WHERE id = ? AND updated >= ?",
+                (session_id, oldest),
+            ).fetchone()
+        if row is None:
+            return []
+        return [(role, content) for role, content in json.loads(row[0])]
+
+    def set(self, session_id: str, history: History) -> None:
+        payload = json.dumps(history, ensure_ascii=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, history, updated) VALUES (?, ?, ?)",
+                (session_id, payload, time.time()),
+            )
+            self._writes += 1
+            if self._writes % self.cleanup_every == 0:
+                self._evict()
+
+    def delete(self, session_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def _evict(self) -> None:
+        if self.ttl > 0:
+            self._conn.execute("DELETE FROM sessions WHERE updated < ?", (time.time() - self.ttl,))
+        self._conn.execute(
+            "DELETE FROM sessions WHERE id NOT IN "
+            "(SELECT id FROM sessions ORDER BY updated DESC LIMIT ?)",
+            (self.max_sessions,),
+        )
+
+    def __len__(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        return int(count)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_session_store(backend: str = SESSION_BACKEND) -> SessionStore:
+    if backend == "sqlite":
+        return SQLiteSessionStore()
+    if backend != "memory":
+        raise ValueError(f"Unknown RAG_SESSION_BACKEND {backend!r} (expected memory or sqlite)")
+    return MemorySessionStore()
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+from .metrics import singleflight_shared
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.task: asyncio.Task | None = None
+        self.waiters = 0
+        self.events: List[Any] = []
+        self.changed = asyncio.Event()
+
+    def wake(self) -> None:
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, event: Any) -> None:
+        self.events.append(event)
+        self.wake()
+
+
+class SingleFlight:
+    """
+    Un seul calcul en cours par cle : les appels concurrents avec la meme cle attendent le
+    resultat du premier (do) ou rejouent ses evenements (stream) au lieu de refaire le travail.
+    Le calcul tourne dans sa propre tache : il survit a la deconnexion du premier client et
+    n'est annule que quand plus personne ne l'attend.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+    def _join(self, key: Hashable, start: Callable[[_Call], Awaitable[Any]]) -> Tuple[_Call, bool]:
+        call = self._calls.get(key)
+        if call is not None and call.task.get_loop() is not asyncio.get_running_loop():
+            call = None  # reste d'une autre event loop (asyncio.run successifs)
+        if call is not None:
+            singleflight_shared.inc(flight=self.name)
+            return call, True
+        call = _Call()
+        call.task = asyncio.ensure_future(start(call))
+        call.task.add_done_callback(lambda task: self._finished(key, call))
+        self._calls[key] = call
+        return call, False
+
+    def _finished(self, key: Hashable, call: _Call) -> None:
+        if self._calls.get(key) is call:
+            del self._calls[key]
+        if not call.task.cancelled():
+            call.task.exception()  # remontee aux appelants, pas de "exception never retrieved"
+        call.wake()
+
+    def _leave(self, key: Hashable, call: _Call) -> None:
+        call.waiters -= 1
+        if call.waiters == 0 and not call.task.done():
+            if self._calls.get(key) is call:
+                del self._calls[key]
+            call.task.cancel()
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Retourne (resultat, partage) ; partage = True si un appel identique etait deja en cours."""
+        call, shared = self._join(key, lambda call: factory())
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task), shared
+        finally:
+            self._leave(key, call)
+
+    def stream(self, key: Hashable, factory: Callable[[], AsyncIterator[Any]]) -> Tuple[AsyncIterator[Any], bool]:
+        """Comme do() pour un flux : chaque abonne recoit tous les evenements depuis le debut."""
+        call, shared = self._join(key, lambda call: self._pump(call, factory()))
+        return self._replay(key, call), shared
+
+    async def _pump(self, call: _Call, source: AsyncIterator[Any]) -> None:
+        async for event in source:
+            call.publish(event)
+
+    async def _replay(self, key: Hashable, call: _Call) -> AsyncIterator[Any]:
+        call.waiters += 1
+        pos = 0
+        try:
+            while True:
+                changed = call.changed
+                while pos < len(call.events):
+                    yield call.events[pos]
+                    pos += 1
+                if call.task.done():
+                    call.task.result()  # erreur du flux partage (ex. Overloaded) pour chaque abonne
+                    return
+                await changed.wait()
+        finally:
+            self._leave(key, call)
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import re
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+from ..app.lexical import tokenize
+
+
+DEFAULT_DIM = 768
+RERANK_PASSAGE_RE = re.compile(r"^\[\d+\] ", re.MULTILINE)
+STREAM_TOKENS = ("Reponse ", "generee ", "par ", "le ", "faux ", "Ollama ", "[1]")
+
+
+def token_bucket(token: str, dim: int = DEFAULT_DIM) -> Tuple[int, float]:
+    code = zlib.crc32(token.encode("utf-8"))
+    return code % dim, 1.0 if code & 0x80000000 else -1.0
+
+
+def hashed_embedding(text: str, dim: int = DEFAULT_DIM) -> np.ndarray:
+    """
+    Embedding deterministe par hachage des mots (feature hashing signe) : deux textes
+    qui partagent des mots ont un cosinus positif, comme avec un vrai modele.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for token in tokenize(text):
+        bucket, sign = token_bucket(token, dim)
+        vector[bucket] += sign
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
+
+
+class FakeOllama:
+    """
+    Remplacant local d'Ollama pour les benchmarks : /api/embeddings, /api/embed et
+    /api/generate (rerank, reponse complete ou stream), avec une latence artificielle.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        dim: int = DEFAULT_DIM,
+        embed_latency: float = 0.0,
+        generate_latency: float = 0.0,
+    ) -> None:
+        self.dim = dim
+        self.embed_latency = embed_latency
+        self.generate_latency = generate_latency
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, path: str) -> None:
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def start(self) -> "FakeOllama":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self) -> None:
+        self._server.serve_forever()
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.embed_latency)
+        return [hashed_embedding(text, self.dim).tolist() for text in texts]
+
+    def generate(self, prompt: str) -> str:
+        time.sleep(self.generate_latency)
+        if prompt.startswith("Tu es un reranker"):
+            passages = len(RERANK_PASSAGE_RE.findall(prompt.split("Passages:", 1)[-1]))
+            return json.dumps([2] * passages)
+        return "".join(STREAM_TOKENS)
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("content-length", "0"))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                fake.count(self.path)
+                if self.path == "/api/embeddings":
+                    self.send_json({"embedding": fake.embed([body.get("prompt", "")])[0]})
+                elif self.path == "/api/embed":
+                    inputs = body.get("input", [])
+                    inputs = [inputs] if isinstance(inputs, str) else inputs
+                    self.send_json({"embeddings": fake.embed(inputs)})
+                elif self.path == "/api/generate" and body.get("stream"):
+                    self.send_stream()
+                elif self.path == "/api/generate":
+                    self.send_json({"response": fake.generate(body.get("prompt", "")), "done": True})
+                else:
+                    self.send_response(404)
+                    self.send_header("content-length", "0")
+                    self.end_headers()
+
+            def send_json(self, payload: Dict[str, Any]) -> None:
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(200)
+                self.send_header("content-type", "application/json")
+                self.send_header("content-length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def send_stream(self) -> None:
+                time.sleep(fake.generate_latency)
+                self.send_response(200)
+                self.send_header("content-type", "application/x-ndjson")
+                self.send_header("transfer-encoding", "chunked")
+                self.end_headers()
+                lines = [{"response": token, "done": False} for token in STREAM_TOKENS]
+                lines.append({"response": "", "done": True})
+                for line in lines:
+                    data = (json.dumps(line) + "\n").encode("utf-8")
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Local stand-in for the Ollama API (benchmarks).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds added to each embedding call.")
+    parser.add_argument("--generate-latency", type=float, default=0.0, help="Seconds added to each generate call.")
+    args = parser.parse_args()
+    fake = FakeOllama(args.host, args.port, args.dim, args.embed_latency, args.generate_latency)
+    print(f"Fake Ollama listening on {fake.base_url}")
+    try:
+        fake.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
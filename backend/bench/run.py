@@ -0,0 +1,364 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+import json
+import os
+from pathlib import Path
+import platform
+import subprocess
+import tempfile
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Sequence
+
+import httpx
+import numpy as np
+
+from ..app import agent, ollama_client, rag
+from ..app.ann import build_ivf
+from ..app.main import app
+from ..app.reloader import IndexReloader
+from ..app.rerank import RERANK_MODE
+from .fake_ollama import DEFAULT_DIM, FakeOllama, hashed_embedding, token_bucket
+
+
+CAMPUSES = ["paris", "lyon", "lille", "bordeaux", "nantes", "marseille", "toulouse", "rennes", "nice", "berlin"]
+PROGRAMS = {
+    "pge": "programme-grande-ecole-informatique",
+    "msc": "master-of-science",
+    "mba": "mba",
+    "bachelor": "bachelor",
+}
+TOPICS = ["admission", "frais", "alternance", "stage", "diplome", "projets", "debouches", "logement"]
+SPECIALTIES = ["data", "cybersecurite", "cloud", "ia", "robotique", "web", "jeux", "devops"]
+FILLER = (
+    "etudiant ecole informatique cursus annee semaine projet equipe pedagogie entreprise "
+    "competence developpement logiciel reseau systeme innovation international campus "
+    "programme formation inscription dossier entretien candidature rentree calendrier "
+    "tarif bourse financement partenaire mobilite certification titre rncp niveau "
+    "experience professionnel carriere metier ingenieur expert technique piscine hub"
+).split()
+QUESTION_TEMPLATES = [
+    "quels sont les {topic} pour le {program} epitech a {campus} ?",
+    "comment se passe {topic} en {program} {specialty} sur le campus epitech de {campus} ?",
+    "quel est le cout et les {topic} du {program} epitech {specialty} ?",
+    "epitech {campus} propose t il {topic} pour le {program} {specialty} ?",
+]
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the RAG pipeline against a local fake Ollama.")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Comma-separated synthetic index sizes (chunks).")
+    parser.add_argument(
+        "--benchmarks",
+        default="load_index,vector_search,search_index,run_agent,chat",
+        help="Comma-separated subset of load_index, vector_search, search_index, run_agent, chat.",
+    )
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM)
+    parser.add_argument("--requests", type=int, default=200, help="Calls per benchmark and size.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--load-repeats", type=int, default=5)
+    parser.add_argument("--embed-latency", type=float, default=0.005, help="Fake Ollama embedding latency (s).")
+    parser.add_argument("--generate-latency", type=float, default=0.05, help="Fake Ollama generate latency (s).")
+    parser.add_argument("--ann", action="store_true", help="Store IVF partitions in the synthetic indexes.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workdir", help="Where synthetic indexes are written (kept between runs).")
+    parser.add_argument("--output", default="bench_results.json")
+    parser.add_argument("--baseline", help="Previous results JSON to compare against.")
+    return parser.parse_args()
+
+
+def synthetic_chunks(count: int, seed: int, chunks_per_page: int = 8) -> List[Dict[str, str]]:
+    """Pages facon epitech.eu (campus, programmes, articles) : mots du theme de la page + remplissage."""
+    rng = np.random.default_rng(seed)
+    chunks: List[Dict[str, str]] = []
+    kinds = list(PROGRAMS) + ["campus", "post"]
+    for page in range((count + chunks_per_page - 1) // chunks_per_page):
+        kind = kinds[page % len(kinds)]
+        campus = CAMPUSES[page % len(CAMPUSES)]
+        specialty = SPECIALTIES[(page // len(kinds)) % len(SPECIALTIES)]
+        if kind == "campus":
+            url = f"https://www.epitech.eu/ecole-informatique-{campus}/page-{page}/"
+            keywords = [campus, "campus", "epitech"]
+        elif kind == "post":
+            url = f"https://www.epitech.eu/2024/{page % 12 + 1:02d}/{page % 28 + 1:02d}/article-{page}/"
+            keywords = ["actualite", campus, "epitech"]
+        else:
+            url = f"https://www.epitech.eu/{PROGRAMS[kind]}-{specialty}/page-{page}/"
+            keywords = [kind, specialty, campus, "epitech"]
+        title = f"{kind.upper()} {specialty} {campus} - Epitech"
+        for part in range(chunks_per_page):
+            if len(chunks) == count:
+                break
+            topic = TOPICS[(page + part) % len(TOPICS)]
+            words = list(rng.choice(FILLER, size=90)) + keywords * 6 + [topic] * 6
+            rng.shuffle(words)
+            chunks.append({"url": url, "title": title, "text": " ".join(words)})
+    return chunks
+
+
+def synthetic_matrix(chunks: Sequence[Dict[str, str]], dim: int) -> np.ndarray:
+    # meme hachage que le faux /api/embeddings, vectorise : les mots sont deja des tokens simples
+    vocab: Dict[str, int] = {}
+    rows: List[int] = []
+    ids: List[int] = []
+    for row, chunk in enumerate(chunks):
+        for word in chunk["text"].split():
+            ids.append(vocab.setdefault(word, len(vocab)))
+            rows.append(row)
+    buckets = np.zeros(len(vocab), dtype=np.int64)
+    signs = np.zeros(len(vocab), dtype=np.float32)
+    for word, pos in vocab.items():
+        buckets[pos], signs[pos] = token_bucket(word, dim)
+    matrix = np.zeros((len(chunks), dim), dtype=np.float32)
+    word_ids = np.asarray(ids, dtype=np.int64)
+    np.add.at(matrix, (np.asarray(rows, dtype=np.int64), buckets[word_ids]), signs[word_ids])
+    return rag.normalize_rows(matrix)
+
+
+def build_synthetic_index(path: Path, count: int, dim: int, seed: int, ann: bool) -> None:
+    chunks = synthetic_chunks(count, seed)
+    entries = [{**chunk, "id": row} for row, chunk in enumerate(chunks)]
+    index = rag.VectorIndex(entries, synthetic_matrix(chunks, dim))
+    index.lexical = rag.build_lexical(index)
+    if ann:
+        index.ann = build_ivf(index.matrix)
+    rag.save_index(index, path)
+
+
+def synthetic_questions(count: int, seed: int) -> List[str]:
+    rng = np.random.default_rng(seed + 1)
+    questions: List[str] = []
+    for _ in range(count):
+        template = QUESTION_TEMPLATES[int(rng.integers(len(QUESTION_TEMPLATES)))]
+        questions.append(
+            template.format(
+                topic=rng.choice(TOPICS),
+                program=rng.choice(list(PROGRAMS)),
+                specialty=rng.choice(SPECIALTIES),
+                campus=rng.choice(CAMPUSES),
+            )
+        )
+    return questions
+
+
+def reset_caches() -> None:
+    # chaque mesure part a froid : les caches ne masquent pas le travail mesure
+    rag.query_embedding_cache.clear()
+    rag.rerank_score_cache.clear()
+    agent.answer_cache.clear()
+
+
+def summarize(name: str, size: int, samples: List[float], wall: float, errors: int, concurrency: int) -> Dict[str, Any]:
+    latencies = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "benchmark": name,
+        "size": size,
+        "requests": len(samples),
+        "concurrency": concurrency,
+        "errors": errors,
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3) if latencies.size else None,
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3) if latencies.size else None,
+        "mean_ms": round(float(latencies.mean()), 3) if latencies.size else None,
+        "max_ms": round(float(latencies.max()), 3) if latencies.size else None,
+        "throughput_rps": round(len(samples) / wall, 2) if wall > 0 else None,
+        "wall_s": round(wall, 3),
+    }
+
+
+def run_threaded(call: Callable[[Any], Any], items: Sequence[Any], concurrency: int) -> tuple:
+    samples: List[float] = []
+    errors = 0
+
+    def timed(item: Any) -> float | None:
+        started = time.perf_counter()
+        try:
+            call(item)
+        except Exception:
+            return None
+        return time.perf_counter() - started
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for elapsed in pool.map(timed, items):
+            if elapsed is None:
+                errors += 1
+            else:
+                samples.append(elapsed)
+    return samples, time.perf_counter() - started, errors
+
+
+async def run_async(call: Callable[[Any], Awaitable[Any]], items: Sequence[Any], concurrency: int) -> tuple:
+    samples: List[float] = []
+    errors = 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def timed(item: Any) -> None:
+        nonlocal errors
+        async with limit:
+            started = time.perf_counter()
+            try:
+                await call(item)
+            except Exception:
+                errors += 1
+                return
+            samples.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(item) for item in items))
+    wall = time.perf_counter() - started
+    await ollama_client.shutdown()
+    return samples, wall, errors
+
+
+def bench_load_index(path: Path, size: int, repeats: int) -> Dict[str, Any]:
+    samples, wall, errors = run_threaded(lambda _: rag.load_index(path), range(repeats), 1)
+    return summarize("load_index", size, samples, wall, errors, 1)
+
+
+def bench_vector_search(index: rag.VectorIndex, size: int, questions: List[str], concurrency: int) -> Dict[str, Any]:
+    # recherche seule, embeddings de question calcules a l'avance (hors HTTP)
+    queries = [(hashed_embedding(question, index.dim), question) for question in questions]
+    samples, wall, errors = run_threaded(
+        lambda item: index.search(item[0], top_k=8, query_text=item[1]), queries, concurrency
+    )
+    return summarize("vector_search", size, samples, wall, errors, concurrency)
+
+
+def bench_search_index(index: rag.VectorIndex, size: int, questions: List[str], concurrency: int) -> Dict[str, Any]:
+    reset_caches()
+    samples, wall, errors = run_threaded(lambda question: rag.search_index(index, question, top_k=8), questions, concurrency)
+    ollama_client.close()
+    return summarize("search_index", size, samples, wall, errors, concurrency)
+
+
+def bench_run_agent(size: int, questions: List[str], concurrency: int) -> Dict[str, Any]:
+    reset_caches()
+    items = list(enumerate(questions))
+    samples, wall, errors = asyncio.run(
+        run_async(lambda item: agent.run_agent(item[1], f"bench-agent-{item[0]}"), items, concurrency)
+    )
+    return summarize("run_agent", size, samples, wall, errors, concurrency)
+
+
+def bench_chat(size: int, questions: List[str], concurrency: int) -> Dict[str, Any]:
+    reset_caches()
+
+    async def main() -> tuple:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+
+            async def post(item: Any) -> None:
+                resp = await client.post("/chat", json={"message": item[1], "session_id": f"bench-chat-{item[0]}"})
+                resp.raise_for_status()
+
+            return await run_async(post, list(enumerate(questions)), concurrency)
+
+    samples, wall, errors = asyncio.run(main())
+    return summarize("chat", size, samples, wall, errors, concurrency)
+
+
+def git_revision() -> str:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).resolve().parents[2],
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except OSError:
+        return ""
+    return result.stdout.strip()
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: Path) -> None:
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    previous = {(row["benchmark"], row["size"]): row for row in baseline.get("results", [])}
+    print(f"Compared with {baseline_path} ({baseline.get('meta', {}).get('git', '?')}):")
+    for row in results:
+        old = previous.get((row["benchmark"], row["size"]))
+        if not old or not old.get("p50_ms") or not row.get("p50_ms"):
+            continue
+        print(
+            f"  {row['benchmark']:<14} {row['size']:>7}  p50 x{row['p50_ms'] / old['p50_ms']:.2f}  "
+            f"p99 x{row['p99_ms'] / old['p99_ms']:.2f}  rps x{row['throughput_rps'] / old['throughput_rps']:.2f}"
+        )
+
+
+def main() -> None:
+    run(parse_args())
+
+
+def run(args: argparse.Namespace) -> None:
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+    benchmarks = [name.strip() for name in args.benchmarks.split(",") if name.strip()]
+    workdir = Path(args.workdir) if args.workdir else Path(tempfile.mkdtemp(prefix="rag-bench-"))
+    fake = FakeOllama(dim=args.dim, embed_latency=args.embed_latency, generate_latency=args.generate_latency).start()
+    # le client Ollama lit son URL a la creation du pool : le faux serveur remplace Ollama
+    ollama_client.close()
+    ollama_client.OLLAMA_BASE_URL = fake.base_url
+    questions = synthetic_questions(args.requests, args.seed)
+    results: List[Dict[str, Any]] = []
+    try:
+        for size in sizes:
+            path = workdir / f"index-{size}-{args.dim}{'-ann' if args.ann else ''}"
+            if not (path / rag.INDEX_CURRENT_FILE).exists():
+                started = time.perf_counter()
+                build_synthetic_index(path, size, args.dim, args.seed, args.ann)
+                print(f"Built synthetic index {path} ({size} chunks) in {time.perf_counter() - started:.1f}s")
+            index = rag.load_index(path)
+            agent.index_reloader = IndexReloader(path, agent.build_url_facets, interval=0)
+            agent.index_reloader.reload()
+            for name in benchmarks:
+                if name == "load_index":
+                    row = bench_load_index(path, size, args.load_repeats)
+                elif name == "vector_search":
+                    row = bench_vector_search(index, size, questions, args.concurrency)
+                elif name == "search_index":
+                    row = bench_search_index(index, size, questions, args.concurrency)
+                elif name == "run_agent":
+                    row = bench_run_agent(size, questions, args.concurrency)
+                elif name == "chat":
+                    row = bench_chat(size, questions, args.concurrency)
+                else:
+                    raise SystemExit(f"Unknown benchmark {name!r}")
+                results.append(row)
+                print(
+                    f"{name:<14} {size:>7} chunks  p50={row['p50_ms']}ms p99={row['p99_ms']}ms "
+                    f"{row['throughput_rps']} req/s errors={row['errors']}"
+                )
+    finally:
+        fake.stop()
+        ollama_client.close()
+
+    payload = {
+        "meta": {
+            "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": git_revision(),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "dim": args.dim,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "embed_latency_s": args.embed_latency,
+            "generate_latency_s": args.generate_latency,
+            "ann": args.ann,
+            "rerank": RERANK_MODE,
+            "seed": args.seed,
+            "fake_ollama_requests": fake.requests,
+        },
+        "results": results,
+    }
+    Path(args.output).write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+    print(f"Results written to {args.output}")
+    if args.baseline:
+        compare(results, Path(args.baseline))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Iterator
+
+import numpy as np
+import pytest
+
+from backend.app import agent, ollama_client, rag
+from backend.app.reloader import IndexReloader
+from backend.bench.fake_ollama import FakeOllama, hashed_embedding
+
+
+DIM = 64
+QUESTION = "Comment se passe l alternance a EPITECH pendant la formation ?"
+CHUNKS = [
+    ("https://www.epitech.eu/alternance", "Alternance", "L alternance a EPITECH alterne formation a l ecole et periodes en entreprise."),
+    ("https://www.epitech.eu/admissions", "Admissions", "Les admissions EPITECH se font sur dossier puis entretien de motivation."),
+    ("https://www.epitech.eu/vie-etudiante", "Vie etudiante", "La vie etudiante a EPITECH : associations, projets et hackathons."),
+]
+
+
+@pytest.fixture
+def fake(monkeypatch: pytest.MonkeyPatch) -> Iterator[FakeOllama]:
+    server = FakeOllama(dim=DIM, generate_latency=0.2).start()
+    ollama_client.close()
+    monkeypatch.setattr(ollama_client, "OLLAMA_BASE_URL", server.base_url)
+    yield server
+    ollama_client.close()
+    server.stop()
+
+
+@pytest.fixture
+def index(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> rag.VectorIndex:
+    entries = [{"url": url, "title": title, "text": text, "id": row} for row, (url, title, text) in enumerate(CHUNKS)]
+    vectors = rag.VectorIndex(entries, np.stack([hashed_embedding(text, DIM) for _, _, text in CHUNKS]))
+    vectors.lexical = rag.build_lexical(vectors)
+    rag.save_index(vectors, tmp_path / "index")
+    reloader = IndexReloader(tmp_path / "index", agent.build_url_facets, interval=0)
+    reloader.reload()
+    monkeypatch.setattr(agent, "index_reloader", reloader)
+    # caches globaux : chaque test repart a froid
+    for cache in (agent.answer_cache, rag.query_embedding_cache, rag.rerank_score_cache):
+        cache.clear()
+    return reloader.current().index
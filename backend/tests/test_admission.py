@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import asyncio
+
+import httpx
+import pytest
+
+from backend.app import admission, rag
+from backend.app.admission import AdmissionLimiter, Overloaded, generate_limiter
+from backend.app.main import app
+from backend.bench.fake_ollama import FakeOllama
+
+from .conftest import QUESTION
+
+
+def test_limiter_rejects_when_queue_is_full() -> None:
+    async def scenario() -> None:
+        limiter = AdmissionLimiter("test", limit=1, max_queue=1, timeout=5)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        assert limiter.waiting == 1
+        with pytest.raises(Overloaded):
+            await limiter.acquire()
+        # la place liberee passe au premier en attente
+        limiter.release()
+        await waiter
+        assert limiter.active == 1 and limiter.waiting == 0
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_limiter_times_out_and_cancelled_waiter_frees_its_place() -> None:
+    async def scenario() -> None:
+        limiter = AdmissionLimiter("test", limit=1, max_queue=2, timeout=0.05)
+        await limiter.acquire()
+        with pytest.raises(Overloaded):
+            await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        limiter.release()
+        assert limiter.active == 0 and limiter.waiting == 0
+
+    asyncio.run(scenario())
+
+
+def test_slot_handed_over_at_timeout_is_given_back(monkeypatch: pytest.MonkeyPatch) -> None:
+    limiter = AdmissionLimiter("test", limit=1, max_queue=1, timeout=0.05)
+
+    async def release_then_time_out(waiter: asyncio.Future, timeout: float) -> None:
+        # release() passe la place au waiter juste avant l'expiration de wait_for
+        limiter.release()
+        await asyncio.sleep(0)
+        raise asyncio.TimeoutError
+
+    async def scenario() -> None:
+        await limiter.acquire()
+        monkeypatch.setattr(admission.asyncio, "wait_for", release_then_time_out)
+        with pytest.raises(Overloaded):
+            await limiter.acquire()
+        monkeypatch.undo()
+        assert limiter.active == 0 and limiter.waiting == 0
+        # toute la capacite est encore disponible
+        await limiter.acquire()
+        assert limiter.active == 1
+
+    asyncio.run(scenario())
+
+
+@pytest.mark.parametrize("path", ["/chat", "/chat/stream"])
+def test_chat_returns_503_when_generate_queue_is_full(
+    path: str, fake: FakeOllama, index: rag.VectorIndex, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(generate_limiter, "limit", 1)
+    monkeypatch.setattr(generate_limiter, "max_queue", 1)
+
+    async def scenario() -> httpx.Response:
+        # une generation en cours + une en attente : la suivante doit etre refusee
+        await generate_limiter.acquire()
+        waiter = asyncio.create_task(generate_limiter.acquire())
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.post(path, json={"message": QUESTION, "session_id": f"busy{path}"})
+        finally:
+            waiter.cancel()
+            await asyncio.gather(waiter, return_exceptions=True)
+            generate_limiter.release()
+
+    resp = asyncio.run(scenario())
+
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == str(generate_limiter.retry_after)
+    assert fake.requests.get("/api/generate") == 1  # le rerank seulement
+
+
+def test_cheap_answers_skip_the_queue(index: rag.VectorIndex, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(generate_limiter, "limit", 1)
+    monkeypatch.setattr(generate_limiter, "max_queue", 0)
+
+    async def scenario() -> httpx.Response:
+        await generate_limiter.acquire()
+        try:
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                return await client.post("/chat", json={"message": "bonjour", "session_id": "cheap"})
+        finally:
+            generate_limiter.release()
+
+    assert asyncio.run(scenario()).status_code == 200
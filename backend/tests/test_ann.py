@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from backend.app import rag
+from backend.app.ann import IVFIndex, build_ivf, evaluate_recall
+
+
+def clustered_matrix(count: int, dim: int, clusters: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(clusters, dim))
+    rows = centers[rng.integers(clusters, size=count)] + rng.normal(scale=0.3, size=(count, dim))
+    return rag.normalize_rows(rows)
+
+
+def test_ivf_recall_against_flat_search() -> None:
+    matrix = clustered_matrix(4000, 32, 40)
+    ivf = build_ivf(matrix, nlist=64)
+
+    assert ivf.offsets[-1] == matrix.shape[0]
+    assert sorted(ivf.order.tolist()) == list(range(matrix.shape[0]))
+    report = {row["nprobe"]: row for row in evaluate_recall(matrix, ivf, top_k=10, nprobe_values=[1, 8, 64])}
+    # toutes les listes sondees = recherche exacte
+    assert report[64]["recall"] == 1.0
+    assert report[8]["recall"] >= 0.9
+    assert report[8]["scanned_fraction"] < 0.3
+    assert report[1]["recall"] <= report[8]["recall"]
+
+
+def test_vector_index_uses_ivf_above_threshold(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    matrix = clustered_matrix(2000, 16, 20, seed=1)
+    entries = [{"url": f"https://www.epitech.eu/{row}", "id": row} for row in range(matrix.shape[0])]
+    index = rag.VectorIndex(entries, matrix, ann=build_ivf(matrix, nlist=32))
+    index.ann.save(tmp_path)
+    monkeypatch.setattr(rag, "ANN_THRESHOLD", 1000)
+    monkeypatch.setattr(rag, "ANN_NPROBE", 32)
+
+    loaded = IVFIndex.load(tmp_path)
+    assert loaded is not None and loaded.nlist == 32
+    assert index.uses_ann()
+    query = matrix[123]
+    approx = [hit["id"] for hit in index.search(query, 5)]
+    exact = rag.top_k_indices(matrix @ query, 5).tolist()
+    # nprobe = nlist : l'IVF parcourt tout et rend le meme top-k que la recherche a plat
+    assert approx == exact
+    monkeypatch.setattr(rag, "ANN_NPROBE", 4)
+    assert [hit["id"] for hit in index.search(query, 5)][0] == 123
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import pytest
+
+from backend.app import cache, rag
+from backend.app.cache import LRUCache
+from backend.bench.fake_ollama import FakeOllama
+
+
+def test_lru_evicts_least_recently_used() -> None:
+    lru = LRUCache(maxsize=2)
+    lru.set("a", 1)
+    lru.set("b", 2)
+    assert lru.get("a") == 1  # "a" redevient le plus recent
+    lru.set("c", 3)
+
+    assert lru.get("b") is None
+    assert lru.get("a") == 1 and lru.get("c") == 3
+    assert lru.stats()["hits"] == 3 and lru.stats()["misses"] == 1
+    assert len(lru) == 2
+
+
+def test_ttl_expires_entries(monkeypatch: pytest.MonkeyPatch) -> None:
+    now = [100.0]
+    monkeypatch.setattr(cache.time, "monotonic", lambda: now[0])
+    lru = LRUCache(maxsize=8, ttl=10.0)
+    lru.set("question", [0.1, 0.2])
+
+    now[0] += 9.0
+    assert lru.get("question") == [0.1, 0.2]
+    now[0] += 2.0
+    assert lru.get("question") is None
+    assert len(lru) == 0
+
+
+def test_disabled_cache_stores_nothing() -> None:
+    lru = LRUCache(maxsize=0)
+    lru.set("a", 1)
+
+    assert lru.get("a", "absent") == "absent"
+
+
+def test_query_embedding_is_cached_by_normalized_question(fake: FakeOllama) -> None:
+    rag.query_embedding_cache.clear()
+
+    first = rag.embed_query("Alternance a EPITECH ?")
+    second = rag.embed_query("  alternance à Epitech")
+
+    assert first == second
+    assert fake.requests.get("/api/embeddings") == 1
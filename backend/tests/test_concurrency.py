@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Dict, List
+
+import httpx
+import pytest
+
+from backend.app import agent, rag
+from backend.app.main import app
+from backend.bench.fake_ollama import FakeOllama
+
+from .conftest import QUESTION
+
+
+def test_identical_questions_share_one_computation(fake: FakeOllama, index: rag.VectorIndex) -> None:
+    async def ask() -> list:
+        return await asyncio.gather(*(agent.run_agent(QUESTION, f"flight-{pos}") for pos in range(10)))
+
+    answers = asyncio.run(ask())
+
+    assert fake.requests.get("/api/embeddings") == 1
+    # un rerank + une generation pour toute la rafale
+    assert fake.requests.get("/api/generate") == 2
+    assert len({answer for answer, _ in answers}) == 1
+    for pos in range(10):
+        assert agent.sessions.get(f"flight-{pos}") == [("user", QUESTION), ("assistant", answers[0][0])]
+
+
+def test_identical_streams_replay_the_same_events(fake: FakeOllama, index: rag.VectorIndex) -> None:
+    async def listen(session_id: str) -> List[Dict[str, object]]:
+        return [event async for event in agent.run_agent_stream(QUESTION, session_id)]
+
+    async def ask() -> list:
+        return await asyncio.gather(*(listen(f"stream-{pos}") for pos in range(5)))
+
+    streams = asyncio.run(ask())
+
+    assert fake.requests.get("/api/embeddings") == 1
+    assert all(events == streams[0] for events in streams)
+    assert streams[0][0]["type"] == "sources" and streams[0][-1]["type"] == "done"
+
+
+@pytest.mark.parametrize("path", ["/chat", "/chat/stream"])
+def test_coalesced_requests_still_report_server_timing(path: str, fake: FakeOllama, index: rag.VectorIndex) -> None:
+    async def ask() -> List[httpx.Response]:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(
+                *(client.post(path, json={"message": QUESTION, "session_id": f"timing-{pos}"}) for pos in range(3))
+            )
+
+    responses = asyncio.run(ask())
+
+    assert fake.requests.get("/api/embeddings") == 1
+    timings = [resp.headers["Server-Timing"] for resp in responses]
+    followers = [timing for timing in timings if "coalesced" in timing]
+    assert len(followers) == 2
+    if path == "/chat":
+        # les etapes du calcul partage sont recopiees sur chaque requete servie par lui
+        assert all("embed;dur=" in timing and "generate;dur=" in timing for timing in followers)
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import asyncio
+from typing import List
+
+import httpx
+import pytest
+
+from backend.app import crawler
+from backend.app.crawler import HostRateLimiter, TokenBucket, parse_crawl_delay
+
+
+ROBOTS = """
+User-agent: *
+Crawl-delay: 1.5
+Disallow: /admin
+
+User-agent: Googlebot
+User-agent: EpitechRAGBot
+Crawl-delay: 0.25 # fractions acceptees
+"""
+
+
+def test_parse_crawl_delay_prefers_our_agent_group() -> None:
+    assert parse_crawl_delay(ROBOTS) == 0.25
+    assert parse_crawl_delay(ROBOTS, agent="OtherBot") == 1.5
+    assert parse_crawl_delay("User-agent: *\nCrawl-delay: soon\n") is None
+    assert parse_crawl_delay("") is None
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> List[float]:
+    # horloge simulee : asyncio.sleep avance le temps au lieu d'attendre
+    now = [0.0]
+
+    async def sleep(delay: float) -> None:
+        now[0] += delay
+
+    monkeypatch.setattr(crawler.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(crawler.asyncio, "sleep", sleep)
+    return now
+
+
+def test_token_bucket_spaces_requests_after_the_burst(clock: List[float]) -> None:
+    async def scenario() -> List[float]:
+        bucket = TokenBucket(rate=2.0, capacity=2.0)
+        granted = []
+        for _ in range(5):
+            await bucket.acquire()
+            granted.append(clock[0])
+        return granted
+
+    # rafale de 2 puis un jeton toutes les 0.5 s
+    assert asyncio.run(scenario()) == pytest.approx([0.0, 0.0, 0.5, 1.0, 1.5])
+
+
+def test_host_limiter_uses_the_slower_of_rate_limit_and_crawl_delay(clock: List[float]) -> None:
+    def robots(request: httpx.Request) -> httpx.Response:
+        if request.url.host == "slow.example" and request.url.path == "/robots.txt":
+            return httpx.Response(200, text="User-agent: *\nCrawl-delay: 2\n")
+        return httpx.Response(404)
+
+    async def scenario() -> List[float]:
+        async with httpx.AsyncClient(transport=httpx.MockTransport(robots)) as client:
+            limiter = HostRateLimiter(client, rate_limit_s=0.5)
+            slow = await limiter.bucket_for("slow.example")
+            fast = await limiter.bucket_for("fast.example")
+            assert await limiter.bucket_for("slow.example") is slow
+            return [slow.rate, fast.rate]
+
+    assert asyncio.run(scenario()) == pytest.approx([0.5, 2.0])
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+from pathlib import Path
+import sys
+from typing import Dict, List
+
+import pytest
+
+from backend.app import indexer, rag
+from backend.bench.fake_ollama import FakeOllama
+
+
+def page(pos: int, version: int = 1) -> Dict[str, str]:
+    return {
+        "url": f"https://www.epitech.eu/page-{pos}",
+        "title": f"Page {pos}",
+        "text": f"Version {version} de la page {pos} sur les formations EPITECH.",
+        "status": "fetched",
+        "hash": f"hash-{pos}-{version}",
+    }
+
+
+def build(
+    monkeypatch: pytest.MonkeyPatch,
+    output: Path,
+    pages: List[Dict[str, str]],
+    *options: str,
+) -> None:
+    monkeypatch.setattr(indexer, "iter_crawl_site", lambda base_url, **kwargs: iter(pages))
+    monkeypatch.setattr(sys, "argv", ["indexer", "--output", str(output), "--no-embed-cache", *options])
+    indexer.run(indexer.parse_args())
+
+
+def test_incremental_reindex_replaces_changed_and_removed_pages(
+    fake: FakeOllama,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    output = tmp_path / "rag_index"
+    build(monkeypatch, output, [page(0), page(1), page(2)])
+    capsys.readouterr()
+
+    removed = {"url": "https://www.epitech.eu/page-2", "status": "removed"}
+    build(monkeypatch, output, [page(0), page(1, version=2), removed], "--incremental")
+
+    assert "1 changed, 1 removed, 1 unchanged pages" in capsys.readouterr().out
+    index = rag.load_index(output)
+    assert sorted(index.urls()) == ["https://www.epitech.eu/page-0", "https://www.epitech.eu/page-1"]
+    assert any("Version 2 de la page 1" in str(entry["text"]) for entry in index)
+    assert set(rag.load_page_manifest(output)) == set(index.urls())
+
+
+def test_up_to_date_reindex_publishes_a_new_generation(
+    fake: FakeOllama,
+    tmp_path: Path,
+    monkeypatch: pytest.MonkeyPatch,
+    capsys: pytest.CaptureFixture[str],
+) -> None:
+    output = tmp_path / "rag_index"
+    build(monkeypatch, output, [page(0), page(1)])
+    published = rag.resolve_index_dir(output)
+    manifest = (published / rag.INDEX_PAGES_FILE).read_bytes()
+
+    unchanged = {**page(1), "lastmod": "2026-10-01"}
+    build(monkeypatch, output, [page(0), unchanged], "--incremental")
+
+    assert "is up to date" in capsys.readouterr().out
+    current = rag.resolve_index_dir(output)
+    # la generation deja servie n'est pas reecrite : le nouvel etat des pages est publie a cote
+    assert current != published
+    assert (published / rag.INDEX_PAGES_FILE).read_bytes() == manifest
+    assert rag.load_page_manifest(output)["https://www.epitech.eu/page-1"]["lastmod"] == "2026-10-01"
+    assert (current / rag.INDEX_VECTORS_FILE).stat().st_ino == (published / rag.INDEX_VECTORS_FILE).stat().st_ino
+    assert len(rag.load_index(output)) == 2
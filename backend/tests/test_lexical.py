@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from backend.app import agent, rag
+from backend.app.lexical import BM25Index, fuse_scores
+
+
+TEXTS = [
+    "Le Bachelors EPITECH forme aux metiers du developpement.",
+    "Alternance et entreprise : le rythme de l alternance a EPITECH.",
+    "EPITECH propose des projets, des hackathons et une piscine.",
+    "Les admissions se font sur dossier puis entretien.",
+]
+
+
+def test_bm25_ranks_documents_with_rare_terms_first() -> None:
+    lexical = BM25Index.build(TEXTS)
+
+    scores = lexical.scores(lexical.query_terms("alternance EPITECH"))
+
+    assert int(np.argmax(scores)) == 1
+    assert scores[3] == 0.0
+    # "alternance" est plus rare que "epitech" : son idf pese plus
+    assert lexical.idf[lexical.vocab["alternance"]] > lexical.idf[lexical.vocab["epitech"]]
+    assert lexical.top_rows(lexical.query_terms("alternance"), 5).tolist() == [1]
+
+
+def test_rows_with_phrase_keeps_rows_holding_every_word() -> None:
+    lexical = BM25Index.build(TEXTS)
+
+    assert lexical.rows_with_phrase("epitech", [3, 0, 2]).tolist() == [0, 2]
+    assert lexical.rows_with_phrase("projets hackathons", range(4)).tolist() == [2]
+    assert lexical.rows_with_phrase("inconnu", range(4)).size == 0
+    assert lexical.document_frequency("epitech") == 3
+    assert lexical.document_frequency("inconnu") == 0
+
+
+def test_sources_cover_terms_uses_postings_and_substrings() -> None:
+    lexical = BM25Index.build(TEXTS)
+    hits = [{"id": row, "text": text} for row, text in enumerate(TEXTS)]
+
+    assert agent.sources_cover_terms(hits[2:3], [["hackathons"]], lexical)
+    # "bachelor" n'est pas un mot de l'index, mais "Bachelors" le contient
+    assert agent.sources_cover_terms(hits[:1], [["bachelor"]], lexical)
+    assert not agent.sources_cover_terms(hits[2:], [["alternance"]], lexical)
+
+
+def test_fuse_scores_only_reorders_when_enabled() -> None:
+    dense = np.array([0.5, 0.4], dtype=np.float32)
+    lexical = np.array([0.0, 6.0], dtype=np.float32)
+
+    assert fuse_scores(dense, lexical, 0.0) is dense
+    assert fuse_scores(dense, np.zeros(2, dtype=np.float32), 0.3) is dense
+    assert fuse_scores(dense, lexical, 0.3).tolist() == pytest.approx([0.5, 0.7])
+
+
+def test_hybrid_search_keeps_cosine_as_score(monkeypatch: pytest.MonkeyPatch) -> None:
+    entries = [{"url": f"https://www.epitech.eu/{row}", "text": text} for row, text in enumerate(TEXTS)]
+    matrix = rag.normalize_rows(np.array([[1.0, 0.1], [0.9, 0.3], [0.2, 1.0], [0.0, 1.0]], dtype=np.float32))
+    vectors = rag.VectorIndex(entries, matrix)
+    vectors.lexical = rag.build_lexical(vectors)
+
+    assert [hit["url"] for hit in vectors.search([1.0, 0.0], 2, query_text="alternance")][0].endswith("/0")
+
+    monkeypatch.setattr(rag, "HYBRID_WEIGHT", 0.5)
+    hits = vectors.search([1.0, 0.0], 2, query_text="alternance")
+
+    assert hits[0]["url"].endswith("/1")
+    assert hits[0]["score"] == pytest.approx(float(matrix[1] @ np.array([1.0, 0.0])))
+    assert hits[0]["hybrid_score"] > hits[1]["hybrid_score"]
@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import pytest
+
+from backend.app.pipeline import CHECKPOINT_FILE, STAGE_PAGES_FILE, StagedIndex, stream_index
+from backend.bench.fake_ollama import FakeOllama
+
+
+def crawled_pages(count: int) -> List[Dict[str, str]]:
+    return [
+        {
+            "url": f"https://www.epitech.eu/page-{pos}",
+            "title": f"Page {pos}",
+            "text": f"Contenu de la page {pos} sur les formations EPITECH.",
+            "status": "fetched",
+            "hash": f"hash-{pos}",
+        }
+        for pos in range(count)
+    ]
+
+
+def test_staged_build_resumes_after_crash(fake: FakeOllama, tmp_path: Path) -> None:
+    pages = crawled_pages(6)
+    settings = {"embed_model": "test"}
+    options = {"embed_model": "test", "batch_size": 1, "concurrency": 1}
+
+    def crash_after(count: int) -> Iterator[Dict[str, str]]:
+        yield from pages[:count]
+        raise RuntimeError("crawl interrupted")
+
+    staged = StagedIndex(tmp_path / "build.partial", settings)
+    with pytest.raises(RuntimeError):
+        stream_index(crash_after(4), staged, {}, **options)
+    staged.close()
+    checkpoint = json.loads((tmp_path / "build.partial" / CHECKPOINT_FILE).read_text(encoding="utf-8"))
+    # le checkpoint ne contient que des tailles : l'etat des pages est dans le journal
+    assert "pages" not in checkpoint
+    assert len((tmp_path / "build.partial" / STAGE_PAGES_FILE).read_text(encoding="utf-8").splitlines()) == 4
+    # fin de journal orpheline (crash entre l'ecriture et le checkpoint) : ignoree a la reprise
+    with (tmp_path / "build.partial" / STAGE_PAGES_FILE).open("a", encoding="utf-8") as handle:
+        handle.write('{"url": "https://www.epitech.eu/page-4", "status": "changed", "state": {}}\n')
+    embedded = fake.requests.get("/api/embed", 0) + fake.requests.get("/api/embeddings", 0)
+
+    resumed = StagedIndex(tmp_path / "build.partial", settings)
+    stats = stream_index(pages, resumed, {}, **options)
+
+    assert resumed.resumed and stats.skipped == 4
+    # seules les pages absentes du checkpoint sont re-embeddees
+    assert fake.requests.get("/api/embed", 0) + fake.requests.get("/api/embeddings", 0) - embedded == 2
+    rebuilt = resumed.to_index()
+    assert [entry["url"] for entry in rebuilt] == [page["url"] for page in pages]
+    resumed.discard()
@@ -0,0 +1,34 @@
+from __future__ import annotations
+
+import logging
+from pathlib import Path
+
+import pytest
+
+from backend.app import rag
+from backend.app.reloader import IndexReloader
+
+
+def test_missing_index_serves_empty_snapshot_and_says_how_to_build(
+    tmp_path: Path, caplog: pytest.LogCaptureFixture
+) -> None:
+    reloader = IndexReloader(tmp_path / "rag_index", len, interval=0)
+
+    with caplog.at_level(logging.WARNING):
+        snapshot = reloader.current()
+
+    assert len(snapshot.index) == 0
+    assert "python -m backend.app.indexer --output" in caplog.text
+
+
+def test_jsonl_index_is_still_served(tmp_path: Path, caplog: pytest.LogCaptureFixture) -> None:
+    path = tmp_path / "rag_index.jsonl"
+    chunks = [rag.IndexChunk("https://www.epitech.eu/", "Accueil", "EPITECH", [1.0, 0.0])]
+    rag.save_index(chunks, path)
+    reloader = IndexReloader(path, len, interval=0)
+
+    with caplog.at_level(logging.WARNING):
+        snapshot = reloader.current()
+
+    assert snapshot.derived == 1
+    assert "rebuild it" in caplog.text
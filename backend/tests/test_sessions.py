@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from backend.app import sessions
+from backend.app.sessions import MemorySessionStore, SQLiteSessionStore, create_session_store, history_size
+
+
+HISTORY = [("user", "Comment candidater ?"), ("assistant", "Sur dossier puis entretien.")]
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> List[float]:
+    now = [1000.0]
+    monkeypatch.setattr(sessions.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(sessions.time, "time", lambda: now[0])
+    return now
+
+
+def test_memory_store_evicts_least_recent_sessions() -> None:
+    store = MemorySessionStore(max_sessions=2, ttl=0)
+    store.set("a", HISTORY)
+    store.set("b", HISTORY)
+    store.get("a")
+    store.set("c", HISTORY)
+
+    assert store.get("b") == []
+    assert store.get("a") == HISTORY and store.get("c") == HISTORY
+    assert len(store) == 2 and store.bytes == 2 * history_size(HISTORY)
+
+
+def test_memory_store_bounds_bytes_and_expires(clock: List[float]) -> None:
+    store = MemorySessionStore(max_sessions=100, ttl=60, max_bytes=2 * history_size(HISTORY))
+    for session_id in ("a", "b", "c"):
+        store.set(session_id, HISTORY)
+    assert len(store) == 2 and store.get("a") == []
+
+    clock[0] += 61
+    assert store.get("b") == []
+    assert store.bytes == history_size(HISTORY)
+
+
+def test_sqlite_store_is_shared_and_evicted(tmp_path: Path, clock: List[float]) -> None:
+    path = tmp_path / "sessions.sqlite"
+    store = SQLiteSessionStore(path, max_sessions=2, ttl=60, cleanup_every=1)
+    other_worker = SQLiteSessionStore(path, max_sessions=2, ttl=60, cleanup_every=1)
+    try:
+        for session_id in ("a", "b", "c"):
+            store.set(session_id, HISTORY)
+            clock[0] += 1
+        assert len(store) == 2 and other_worker.get("a") == []
+        assert other_worker.get("c") == HISTORY
+
+        clock[0] += 61
+        assert store.get("c") == []
+        other_worker.set("d", HISTORY)
+        assert len(store) == 1
+    finally:
+        store.close()
+        other_worker.close()
+
+
+def test_unknown_backend_is_rejected() -> None:
+    with pytest.raises(ValueError):
+        create_session_store("redis")
@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from backend.app import rag
+
+
+def cosine_top_k(entries: List[Dict[str, Any]], query: List[float], top_k: int) -> List[int]:
+    # ancien chemin : une similarite cosinus Python par entree, tri stable
+    scored = [(rag.cosine_similarity(query, entry["embedding"]), row) for row, entry in enumerate(entries)]
+    scored.sort(key=lambda item: -item[0])
+    return [row for _, row in scored[:top_k]]
+
+
+def make_entries(count: int, dim: int, seed: int = 0) -> List[Dict[str, Any]]:
+    rng = np.random.default_rng(seed)
+    vectors = rng.normal(size=(count, dim))
+    return [{"url": f"https://www.epitech.eu/{row}", "embedding": vector.tolist()} for row, vector in enumerate(vectors)]
+
+
+def search_rows(index: rag.VectorIndex, query: Sequence[float], top_k: int, **kwargs: Any) -> List[int]:
+    return [hit["id"] for hit in index.search(query, top_k, **kwargs)]
+
+
+def test_search_matches_python_cosine_ranking() -> None:
+    entries = make_entries(500, 32)
+    index = rag.VectorIndex.from_entries(entries)
+    queries = np.random.default_rng(1).normal(size=(20, 32)).tolist()
+
+    for query in queries:
+        assert search_rows(index, query, 8) == cosine_top_k(entries, query, 8)
+    hit = index.search(queries[0], 1)[0]
+    assert abs(hit["score"] - rag.cosine_similarity(queries[0], entries[hit["id"]]["embedding"])) < 1e-5
+    assert "embedding" not in hit
+
+
+def test_search_restricted_to_rows_and_degenerate_inputs() -> None:
+    entries = make_entries(50, 8)
+    index = rag.VectorIndex.from_entries(entries)
+    query = entries[7]["embedding"]
+    rows = [3, 7, 11, 40]
+
+    subset = [entries[row] for row in rows]
+    assert search_rows(index, query, 2, rows=rows) == [rows[pos] for pos in cosine_top_k(subset, query, 2)]
+    assert search_rows(index, query, 100) == cosine_top_k(entries, query, 100)
+    assert index.search([0.0] * 8, 3) == []
+    assert index.search([1.0] * 3, 3) == []
+    assert index.search(query, 0) == []
+    assert index.search(query, 3, rows=[]) == []
+
+
+def test_ties_keep_index_order() -> None:
+    entries = [{"url": str(row), "embedding": [1.0, 0.0]} for row in range(5)]
+    index = rag.VectorIndex.from_entries(entries)
+
+    assert search_rows(index, [1.0, 0.0], 3) == [0, 1, 2]
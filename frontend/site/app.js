@@ -56,6 +56,29 @@ function addMessage(who, text) {
   return bubble; // pour pouvoir modifier le texte plus tard
 }
 
+// Bloc "Sources" (liens cliquables) sous la reponse
+function renderSources(list) {
+  if (!Array.isArray(list) || list.length === 0) return null;
+  const sources = document.createElement("div");
+  sources.classList.add("sources");
+  const title = document.createElement("div");
+  title.classList.add("sources-title");
+  title.textContent = "Sources";
+  sources.appendChild(title);
+
+  list.slice(0, 4).forEach((source) => {
+    const item = document.createElement("div");
+    const link = document.createElement("a");
+    link.href = source.url;
+    link.target = "_blank";
+    link.rel = "noopener noreferrer";
+    link.textContent = source.url;
+    item.appendChild(link);
+    sources.appendChild(item);
+  });
+  return sources;
+}
+
 // Événement sur le formulaire / bouton
 chatForm.addEventListener("submit", async (e) => {
   e.preventDefault();
@@ -73,40 +96,66 @@ chatForm.addEventListener("submit", async (e) => {
   const bubble = addMessage("bot", "Recherche en cours...");
 
   try {
-    const resp = await fetch(`${apiBase}/chat`, {
+    const resp = await fetch(`${apiBase}/chat/stream`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
       body: JSON.stringify({ message: text, session_id: sessionId }),
     });
 
-    if (!resp.ok) {
+    if (resp.status === 503) {
+      // Serveur sature : le backend indique quand reessayer
+      const retryAfter = resp.headers.get("Retry-After") || "quelques";
+      bubble.textContent = `Le serveur est très sollicité, réessaie dans ${retryAfter} secondes.`;
+      return;
+    }
+    if (!resp.ok || !resp.body) {
       throw new Error("API error");
     }
 
-    const data = await resp.json();
-    const answer = data.answer || "Je n'ai pas de réponse pour l'instant.";
-    bubble.textContent = answer;
+    // Rendu progressif : texte de la reponse + bloc sources separes
+    const answerText = document.createTextNode("");
+    let sourcesBlock = null;
+    let started = false;
 
-    if (Array.isArray(data.sources) && data.sources.length > 0) {
-      const sources = document.createElement("div");
-      sources.classList.add("sources");
-      const title = document.createElement("div");
-      title.classList.add("sources-title");
-      title.textContent = "Sources";
-      sources.appendChild(title);
+    const handleEvent = (event) => {
+      if (event.type === "sources") {
+        // Sources affichees des la fin du retrieval, avant la generation
+        sourcesBlock = renderSources(event.sources);
+        if (!started && sourcesBlock) {
+          bubble.textContent = "Rédaction de la réponse...";
+          bubble.appendChild(sourcesBlock);
+        }
+      } else if (event.type === "token") {
+        if (!started) {
+          bubble.textContent = "";
+          bubble.appendChild(answerText);
+          if (sourcesBlock) bubble.appendChild(sourcesBlock);
+          started = true;
+        }
+        answerText.appendData(event.text);
+      } else if (event.type === "done" && !started) {
+        bubble.textContent = event.answer || "Je n'ai pas de réponse pour l'instant.";
+        if (sourcesBlock) bubble.appendChild(sourcesBlock);
+        started = true;
+      }
+      chatWindow.scrollTop = chatWindow.scrollHeight;
+    };
 
-      data.sources.slice(0, 4).forEach((source) => {
-        const item = document.createElement("div");
-        const link = document.createElement("a");
-        link.href = source.url;
-        link.target = "_blank";
-        link.rel = "noopener noreferrer";
-        link.textContent = source.url;
-        item.appendChild(link);
-        sources.appendChild(item);
-      });
+    const reader = resp.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    while (true) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      const lines = buffer.split("\n");
+      buffer = lines.pop();
+      lines.filter((line) => line.trim()).forEach((line) => handleEvent(JSON.parse(line)));
+    }
+    if (buffer.trim()) handleEvent(JSON.parse(buffer));
 
-      bubble.appendChild(sources);
+    if (!started) {
+      bubble.textContent = "Je n'ai pas de réponse pour l'instant.";
     }
   } catch (err) {
     bubble.textContent = "Erreur : impossible de joindre le serveur.";